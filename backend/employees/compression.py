@@ -0,0 +1,195 @@
+import base64
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_MAX_ENTRIES = 64
+
+_compressed_cache: 'OrderedDict[Tuple[str, str], str]' = OrderedDict()
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    '''Case-insensitive request header lookup'''
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    '''Pick the best supported encoding from an Accept-Encoding header'''
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        pieces = part.strip().split(';')
+        coding = pieces[0].strip().lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    best_quality = 0.0
+    for coding in candidates:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best = coding
+            best_quality = quality
+    return best
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    '''Compress raw bytes with the given content coding'''
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compute_etag(body: str) -> str:
+    '''Strong ETag derived from the uncompressed response body'''
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+def representation_etag(etag: str, encoding: Optional[str]) -> str:
+    '''
+    ETag of one encoding of the body: a gzip or brotli representation has
+    different bytes from the identity one, so its strong validator carries
+    the coding as a suffix, as Apache's mod_deflate does.
+    '''
+    if encoding is None:
+        return etag
+    return etag[:-1] + '-' + encoding + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''Weak comparison of If-None-Match against an ETag, as RFC 9110 asks for'''
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+def add_vary(headers: Dict[str, str], field: str) -> None:
+    existing = headers.get('Vary')
+    if not existing:
+        headers['Vary'] = field
+    elif field.lower() not in [value.strip().lower() for value in existing.split(',')]:
+        headers['Vary'] = existing + ', ' + field
+
+def _cached_compress(etag: str, body: bytes, encoding: str) -> str:
+    cache_key = (etag, encoding)
+    cached = _compressed_cache.get(cache_key)
+    if cached is not None:
+        _compressed_cache.move_to_end(cache_key)
+        return cached
+
+    encoded = base64.b64encode(compress_bytes(body, encoding)).decode('ascii')
+    _compressed_cache[cache_key] = encoded
+    if len(_compressed_cache) > CACHE_MAX_ENTRIES:
+        _compressed_cache.popitem(last=False)
+    return encoded
+
+def compress_response(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Apply ETag validation and Accept-Encoding negotiation to a handler response.
+    Successful GET responses get an ETag so unchanged resources can be answered
+    with 304 and their compressed bodies served from the in-process cache.
+    Every negotiated response says Vary: Accept-Encoding, including those
+    left uncompressed, so shared caches keep one copy per coding.
+    '''
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded'):
+        return response
+
+    headers = dict(response.get('headers') or {})
+    method = event.get('httpMethod', 'GET')
+    status_code = response.get('statusCode', 200)
+    add_vary(headers, 'Accept-Encoding')
+
+    raw = body.encode('utf-8')
+    encoding = choose_encoding(get_header(event, 'Accept-Encoding'))
+    if len(raw) < MIN_COMPRESS_SIZE:
+        encoding = None
+
+    etag = None
+    if method == 'GET' and status_code == 200:
+        etag = compute_etag(body)
+        headers['ETag'] = representation_etag(etag, encoding)
+        if etag_matches(get_header(event, 'If-None-Match'), headers['ETag']):
+            headers.pop('Content-Type', None)
+            return {
+                'statusCode': 304,
+                'headers': headers,
+                'body': '',
+                'isBase64Encoded': False
+            }
+
+    if encoding is None:
+        response = dict(response)
+        response['headers'] = headers
+        return response
+
+    if etag:
+        encoded = _cached_compress(etag, raw, encoding)
+    else:
+        encoded = base64.b64encode(compress_bytes(raw, encoding)).decode('ascii')
+
+    headers['Content-Encoding'] = encoding
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': encoded,
+        'isBase64Encoded': True
+    }
+
+if __name__ == '__main__':
+    import json
+    import time
+
+    def build_payload(count: int) -> str:
+        tasks = []
+        for i in range(count):
+            tasks.append({
+                'id': str(i),
+                'title': f'Подготовить отчет по мониторингу №{i}',
+                'description': 'Собрать данные по поступлениям геологической информации за период',
+                'status': ['pending', 'in-progress', 'completed', 'overdue'][i % 4],
+                'priority': ['high', 'medium', 'low'][i % 3],
+                'assignee': ['Иванов А.С.', 'Петрова М.В.', 'Сидоров П.К.'][i % 3],
+                'dueDate': '2024-11-30T23:59:59',
+                'createdAt': '2024-11-01T09:00:00',
+                'updatedAt': '2024-11-01T09:00:00',
+                'attachments': []
+            })
+        return json.dumps({'tasks': tasks})
+
+    levels = [('gzip', level) for level in (1, 6, 9)]
+    if brotli is not None:
+        levels += [('br', quality) for quality in (1, 5, 9)]
+
+    print(f'{"rows":>6} {"raw KB":>8} {"coding":>8} {"lvl":>4} {"out KB":>8} {"saved":>7} {"ms":>8}')
+    for count in (100, 1000, 5000):
+        raw = build_payload(count).encode('utf-8')
+        for coding, level in levels:
+            rounds = 20
+            started = time.perf_counter()
+            for _ in range(rounds):
+                if coding == 'br':
+                    out = brotli.compress(raw, quality=level)
+                else:
+                    out = gzip.compress(raw, compresslevel=level, mtime=0)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / rounds
+            saved = 1 - len(out) / len(raw)
+            print(f'{count:>6} {len(raw) / 1024:>8.1f} {coding:>8} {level:>4} {len(out) / 1024:>8.1f} {saved:>7.1%} {elapsed_ms:>8.2f}')
@@ -0,0 +1,192 @@
+import base64
+import os
+import re
+import uuid
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import quote
+
+from responses import MAX_RAW_BODY_BYTES, json_response
+from statements import Statement, run
+from storage import get_storage
+
+# Largest body one function response carries; bigger files are read in ranges
+MAX_RESPONSE_BYTES = MAX_RAW_BODY_BYTES
+STORE_CHUNK_SIZE = 1024 * 1024
+# Stored exports are fetched right after the redirect; keep them a day
+EXPORT_TTL_HOURS = int(os.environ.get('EXPORT_TTL_HOURS', '24'))
+EXPORT_PURGE_BATCH_SIZE = 200
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+STORED_OBJECT = Statement('stored_object', 'SELECT size, content_type FROM attachment_objects WHERE sha256 = $1')
+
+# An object that is also an attachment (expires_at NULL) stays forever
+EXPORT_OBJECT_INSERT = Statement('export_object_insert', '''
+    INSERT INTO attachment_objects (sha256, size, content_type, expires_at)
+    VALUES ($1, $2, $3, NOW() + make_interval(hours => $4))
+    ON CONFLICT (sha256) DO UPDATE SET expires_at = CASE
+        WHEN attachment_objects.expires_at IS NULL THEN NULL
+        ELSE GREATEST(attachment_objects.expires_at, EXCLUDED.expires_at)
+    END''')
+
+# Expired rows are looked up by primary key from an array, not hash-joined
+EXPIRED_EXPORTS_DELETE = Statement('expired_exports_delete', '''
+    DELETE FROM attachment_objects
+    WHERE sha256 = ANY(ARRAY(
+        SELECT sha256 FROM attachment_objects
+        WHERE expires_at < NOW()
+        ORDER BY expires_at
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    ))
+    RETURNING sha256''')
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    '''Parse a single "bytes=" range into inclusive offsets, None if unsatisfiable'''
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+
+    if not match.group(1):
+        suffix = int(match.group(2))
+        if suffix == 0:
+            return None
+        start = max(0, size - suffix)
+        end = size - 1
+    else:
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        end = min(end, size - 1)
+
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def download_object(cur, event: Dict[str, Any], sha256: str, file_name: str) -> Dict[str, Any]:
+    '''
+    Serve a stored file, honouring a single byte range for partial downloads.
+    Without a Range header the whole file is sent, or the client is
+    redirected to storage that can send it; files over MAX_RESPONSE_BYTES
+    without a direct URL are only available in ranges of at most that size.
+    '''
+    if not SHA256_PATTERN.match(sha256):
+        return json_response(400, {'error': 'Invalid file hash'})
+
+    run(cur, STORED_OBJECT, (sha256,))
+    stored = cur.fetchone()
+    if not stored:
+        return json_response(404, {'error': 'File not found'})
+
+    storage = get_storage()
+    size = stored['size']
+    headers = {
+        'Content-Type': stored['content_type'],
+        'Access-Control-Allow-Origin': '*',
+        'Accept-Ranges': 'bytes',
+        'Access-Control-Expose-Headers': 'Content-Range',
+        'ETag': f'"{sha256}"',
+        'Cache-Control': 'private, max-age=31536000, immutable',
+        'Content-Disposition': f"attachment; filename*=UTF-8''{quote(file_name)}"
+    }
+
+    request_headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    range_header = request_headers.get('range')
+
+    if not range_header:
+        direct_url = storage.download_url(sha256, file_name)
+        if direct_url:
+            return {
+                'statusCode': 302,
+                'headers': {'Location': direct_url, 'Access-Control-Allow-Origin': '*'},
+                'body': '',
+                'isBase64Encoded': False
+            }
+        if size > MAX_RESPONSE_BYTES:
+            # A 206 here would hand a plain download a silently truncated file
+            return json_response(413, {
+                'error': f'File is larger than {MAX_RESPONSE_BYTES} bytes, request it in parts with a Range header',
+                'size': size
+            }, {'Accept-Ranges': 'bytes'})
+        data = storage.read_range(sha256, 0, size - 1) if size else b''
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': base64.b64encode(data).decode('ascii'),
+            'isBase64Encoded': True
+        }
+
+    byte_range = parse_range(range_header, size)
+    if not byte_range:
+        return json_response(416, {'error': 'Requested range not satisfiable'}, {'Content-Range': f'bytes */{size}'})
+
+    start, end = byte_range
+    end = min(end, start + MAX_RESPONSE_BYTES - 1)
+    data = storage.read_range(sha256, start, end)
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    return {
+        'statusCode': 206,
+        'headers': headers,
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+def store_export(cur, conn, out, file_name: str, content_type: str) -> Dict[str, Any]:
+    '''
+    Persist an export too large to inline as a stored object and redirect
+    to where it can be read in full: the storage's own URL when it has one,
+    otherwise ?resource=downloads, which serves it in ranges.
+    '''
+    storage = get_storage()
+    upload_id = str(uuid.uuid4())
+    offset = 0
+    for chunk in iter(lambda: out.read(STORE_CHUNK_SIZE), b''):
+        storage.write_chunk(upload_id, offset, chunk)
+        offset += len(chunk)
+    out.close()
+
+    sha256, size = storage.finalize(upload_id, offset)
+    run(cur, EXPORT_OBJECT_INSERT, (sha256, size, content_type, EXPORT_TTL_HOURS))
+    conn.commit()
+
+    location = storage.download_url(sha256, file_name) or f'?resource=downloads&sha256={sha256}&name={quote(file_name)}'
+    return {
+        'statusCode': 303,
+        'headers': {
+            'Location': location,
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def purge_expired_exports(conn, batch_size: int = EXPORT_PURGE_BATCH_SIZE) -> int:
+    '''
+    Delete stored exports past their expires_at, rows first and then the
+    objects, in batches that commit on their own. Attachments never expire.
+    '''
+    storage = get_storage()
+    cur = conn.cursor()
+    purged = 0
+    while True:
+        run(cur, EXPIRED_EXPORTS_DELETE, (batch_size,))
+        expired = [row['sha256'] for row in cur.fetchall()]
+        conn.commit()
+        for sha256 in expired:
+            storage.delete_object(sha256)
+        purged += len(expired)
+        if len(expired) < batch_size:
+            break
+
+    cur.close()
+    return purged
+
+def handle_download_request(cur, event: Dict[str, Any]) -> Dict[str, Any]:
+    '''GET ?resource=downloads&sha256&name serves a stored export or attachment (Range supported)'''
+    query_params = event.get('queryStringParameters') or {}
+    if event.get('httpMethod', 'GET') != 'GET':
+        return json_response(405, {'error': 'Method not allowed'})
+    if not query_params.get('sha256'):
+        return json_response(400, {'error': 'sha256 is required'})
+    return download_object(cur, event, query_params['sha256'], query_params.get('name') or query_params['sha256'])
@@ -0,0 +1,233 @@
+import base64
+import csv
+import io
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, IO, List, Sequence, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from responses import MAX_RAW_BODY_BYTES
+
+FETCH_SIZE = 2000
+SPOOL_MAX_SIZE = 1024 * 1024
+MAX_INLINE_BYTES = MAX_RAW_BODY_BYTES
+# Exports sort whole tables by their report order; the default 4MB spills
+# a few tens of thousands of rows to disk
+EXPORT_WORK_MEM = '64MB'
+UTF8_BOM = b'\xef\xbb\xbf'
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>'''
+
+XLSX_ROOT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+XLSX_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+XLSX_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>'''
+
+def select_list(columns: List[Tuple[str, str]]) -> str:
+    '''SELECT list aliasing each column to its report header, used by COPY for the CSV header row'''
+    return ', '.join(f'{expression} AS "{label}"' for expression, label in columns)
+
+def iter_query_rows(conn, query: str, params: Sequence[Any], cursor_name: str) -> Iterable[Tuple]:
+    '''Stream rows through a server-side cursor, FETCH_SIZE rows per round trip'''
+    from psycopg2.extensions import cursor as tuple_cursor
+    cur = conn.cursor(name=cursor_name, cursor_factory=tuple_cursor)
+    cur.itersize = FETCH_SIZE
+    cur.execute(query, params)
+    try:
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+def copy_query_csv(conn, query: str, params: Sequence[Any], out: IO[bytes]) -> None:
+    '''Let Postgres render CSV itself with COPY ... TO STDOUT straight into the output file'''
+    cur = conn.cursor()
+    copy_sql = 'COPY (' + cur.mogrify(query, params).decode('utf-8') + ') TO STDOUT WITH (FORMAT csv, HEADER true)'
+    out.write(UTF8_BOM)
+    cur.copy_expert(copy_sql, out)
+    cur.close()
+
+def write_csv(rows: Iterable[Sequence[Any]], columns: List[str], out: IO[bytes]) -> int:
+    '''Write rows as UTF-8 CSV with a BOM so spreadsheet apps detect Cyrillic correctly'''
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    text.write('\ufeff')
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(['' if value is None else format_value(value) for value in row])
+        count += 1
+    text.detach()
+    return count
+
+def format_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+def column_letter(index: int) -> str:
+    '''Spreadsheet column name for a zero-based index: 0 -> A, 26 -> AA'''
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def xlsx_cell(reference: str, value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    text = ILLEGAL_XML_CHARS.sub('', str(format_value(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+def write_xlsx(rows: Iterable[Sequence[Any]], columns: List[str], out: IO[bytes], sheet_name: str = 'Export') -> int:
+    '''
+    Minimal single-sheet XLSX writer. The worksheet XML is streamed row by
+    row into the deflate stream of the zip entry, so memory use does not
+    grow with the number of rows. Strings are written inline to avoid
+    building a shared string table in memory.
+    '''
+    count = 0
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        workbook.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        workbook.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(sheet_name=escape(sheet_name)))
+        workbook.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            letters = [column_letter(index) for index in range(len(columns))]
+            header = ''.join(xlsx_cell(f'{letters[index]}1', name) for index, name in enumerate(columns))
+            sheet.write(f'<row r="1">{header}</row>'.encode('utf-8'))
+
+            buffer = []
+            for row in rows:
+                count += 1
+                row_number = count + 1
+                cells = ''.join(xlsx_cell(f'{letters[index]}{row_number}', value) for index, value in enumerate(row))
+                buffer.append(f'<row r="{row_number}">{cells}</row>')
+                if len(buffer) >= FETCH_SIZE:
+                    sheet.write(''.join(buffer).encode('utf-8'))
+                    buffer.clear()
+            if buffer:
+                sheet.write(''.join(buffer).encode('utf-8'))
+
+            sheet.write(b'</sheetData></worksheet>')
+    return count
+
+def export_query(conn, query: str, params: Sequence[Any], columns: List[str], export_format: str,
+                 sheet_name: str) -> IO[bytes]:
+    '''
+    Render a query as CSV (via COPY) or XLSX (via a server-side cursor) into a
+    spooled temporary file that moves to disk once it outgrows SPOOL_MAX_SIZE.
+    The query sorts with EXPORT_WORK_MEM for the rest of the transaction.
+    The file is returned rewound to the start.
+    '''
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    cur = conn.cursor()
+    cur.execute('SET LOCAL work_mem = %s', (EXPORT_WORK_MEM,))
+    cur.close()
+    if export_format == 'xlsx':
+        write_xlsx(iter_query_rows(conn, query, params, 'export_cursor'), columns, out, sheet_name)
+    else:
+        copy_query_csv(conn, query, params, out)
+    out.seek(0)
+    return out
+
+def exported_size(out: IO[bytes]) -> int:
+    out.seek(0, os.SEEK_END)
+    size = out.tell()
+    out.seek(0)
+    return size
+
+def file_response(out: IO[bytes], file_name: str, content_type: str) -> Dict[str, Any]:
+    '''Return a finished export as a base64 download; only used below MAX_INLINE_BYTES'''
+    data = out.read()
+    out.close()
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': content_type,
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(file_name)}",
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': base64.b64encode(data).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+if __name__ == '__main__':
+    import resource
+    import sys
+    import time
+
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    columns = ['ID', 'Название', 'Статус', 'Приоритет', 'Исполнитель', 'Срок']
+
+    def synthetic_rows():
+        due = datetime(2024, 11, 30, 23, 59, 59)
+        for i in range(row_count):
+            yield (i, f'Подготовить отчет по мониторингу №{i}', 'pending', 'high', 'Иванов А.С.', due)
+
+    for name, writer in (('csv', write_csv), ('xlsx', write_xlsx)):
+        with tempfile.TemporaryFile() as out:
+            started = time.perf_counter()
+            written = writer(synthetic_rows(), columns, out)
+            elapsed = time.perf_counter() - started
+            size_mb = out.tell() / 1024 / 1024
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f'{name:>5}: {written} rows in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s), '
+              f'{size_mb:.1f} MB output, peak RSS {peak_mb:.0f} MB')
+
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        import psycopg2
+
+        conn = psycopg2.connect(database_url)
+        query = '''SELECT g AS "ID", 'Подготовить отчет по мониторингу №' || g AS "Название",
+                          'pending' AS "Статус", 'high' AS "Приоритет", 'Иванов А.С.' AS "Исполнитель",
+                          NOW() + make_interval(days => g % 365) AS "Срок"
+                   FROM generate_series(1, %s) g'''
+        for export_format in ('csv', 'xlsx'):
+            started = time.perf_counter()
+            out = export_query(conn, query, (row_count,), columns, export_format, 'Export')
+            elapsed = time.perf_counter() - started
+            out.seek(0, os.SEEK_END)
+            size_mb = out.tell() / 1024 / 1024
+            out.close()
+            conn.rollback()
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f'{export_format:>5} from Postgres: {row_count} rows in {elapsed:.1f}s '
+                  f'({row_count / elapsed:,.0f} rows/s), {size_mb:.1f} MB output, peak RSS {peak_mb:.0f} MB')
+        conn.close()
@@ -0,0 +1,107 @@
+import hashlib
+import random
+from typing import Dict, Any, Optional
+
+from statements import Statement, run
+
+MAX_KEY_LENGTH = 255
+KEY_TTL = '24 hours'
+PURGE_BATCH_SIZE = 500
+PURGE_PROBABILITY = 0.02
+
+IDEMPOTENCY_LOCK = Statement('idempotency_lock', 'SELECT pg_advisory_xact_lock(hashtext($1))')
+
+IDEMPOTENCY_LOOKUP = Statement('idempotency_lookup', '''
+    SELECT request_hash, status_code, response_body
+    FROM idempotency_keys
+    WHERE scope = $1 AND idempotency_key = $2 AND expires_at > NOW()''')
+
+IDEMPOTENCY_STORE = Statement('idempotency_store', f'''
+    INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, status_code, response_body, expires_at)
+    VALUES ($1, $2, $3, $4, $5, NOW() + INTERVAL '{KEY_TTL}')
+    ON CONFLICT (scope, idempotency_key) DO UPDATE SET
+        request_hash = EXCLUDED.request_hash,
+        status_code = EXCLUDED.status_code,
+        response_body = EXCLUDED.response_body,
+        created_at = NOW(),
+        expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at <= NOW()''')
+
+IDEMPOTENCY_PURGE = Statement('idempotency_purge', '''
+    DELETE FROM idempotency_keys
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM idempotency_keys
+        WHERE expires_at <= NOW()
+        LIMIT $1
+    ))''')
+
+def get_idempotency_key(event: Dict[str, Any]) -> Optional[str]:
+    '''Read the Idempotency-Key request header, if the client sent one'''
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'idempotency-key' and value:
+            return value.strip()
+    return None
+
+def request_fingerprint(event: Dict[str, Any]) -> str:
+    '''Hash of the request body used to detect a key reused for a different payload'''
+    body = event.get('body') or ''
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def acquire_idempotency_key(cur, scope: str, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    '''
+    Serialize requests sharing a key with a transaction-scoped advisory lock.
+    Returns the stored response when the key was already used, so the caller
+    can replay it instead of repeating the insert. A concurrent duplicate waits
+    on the lock until the first request commits and then sees its response.
+    '''
+    run(cur, IDEMPOTENCY_LOCK, (f'{scope}:{key}',))
+    run(cur, IDEMPOTENCY_LOOKUP, (scope, key))
+    stored = cur.fetchone()
+
+    if not stored:
+        return None
+
+    if stored['request_hash'] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': '{"error": "Idempotency-Key was already used with a different request body"}',
+            'isBase64Encoded': False
+        }
+
+    return {
+        'statusCode': stored['status_code'],
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Idempotent-Replayed': 'true'
+        },
+        'body': stored['response_body'],
+        'isBase64Encoded': False
+    }
+
+def store_idempotent_response(cur, scope: str, key: str, request_hash: str, response: Dict[str, Any]) -> None:
+    '''Save the first response for a key in the same transaction as the insert it describes'''
+    run(cur, IDEMPOTENCY_STORE, (scope, key, request_hash, response['statusCode'], response['body']))
+
+def purge_expired_keys(cur, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    '''Delete one bounded batch of expired keys and return how many were removed'''
+    run(cur, IDEMPOTENCY_PURGE, (batch_size,))
+    return cur.rowcount
+
+def maybe_purge_expired_keys(conn) -> None:
+    '''Occasionally purge one batch after a write so expired keys never pile up'''
+    if random.random() >= PURGE_PROBABILITY:
+        return
+    cur = conn.cursor()
+    try:
+        purge_expired_keys(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        cur.close()
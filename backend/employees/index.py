@@ -1,25 +1,109 @@
 import json
+import logging
 import os
-import hashlib
-import secrets
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-def get_db_connection():
-    '''Get database connection using DATABASE_URL from environment'''
+from compression import compress_response
+from downloads import handle_download_request, store_export
+from ratelimit import RateLimiter, DEFAULT_BUDGETS, rejection_response
+from resilience import CircuitBreaker, CONNECT_TIMEOUT_SECONDS, STATEMENT_TIMEOUTS_MS, metrics_response
+from workload import get_workload_report
+from queries import (
+    EMPLOYEE_LIST,
+    EMPLOYEE_LIST_BY_GROUP,
+    EMPLOYEE_INSERT,
+    EMPLOYEE_UPDATE,
+    EMPLOYEE_DELETE,
+    GROUP_NAME,
+    GROUP_LIST,
+    GROUP_INSERT,
+    GROUP_UPDATE,
+    GROUP_EMPLOYEE_COUNT,
+    GROUP_RELEASE_EMPLOYEES,
+    GROUP_DELETE,
+    USER_LOGIN,
+    USER_TOUCH_LOGIN,
+    USER_REHASH,
+    DEPARTMENT_STRUCTURE,
+    parse_employee_page,
+    employee_update_params
+)
+from statements import ConnectionPool, run
+from passwords import needs_rehash, rehash_password, verify_password
+from sessions import issue_session_token
+from export import (
+    CSV_CONTENT_TYPE,
+    XLSX_CONTENT_TYPE,
+    MAX_INLINE_BYTES,
+    select_list,
+    export_query,
+    exported_size,
+    file_response
+)
+from idempotency import (
+    MAX_KEY_LENGTH,
+    get_idempotency_key,
+    request_fingerprint,
+    acquire_idempotency_key,
+    store_idempotent_response,
+    maybe_purge_expired_keys
+)
+
+rate_limiter = RateLimiter(DEFAULT_BUDGETS)
+db_breaker = CircuitBreaker()
+db_pool = ConnectionPool()
+logger = logging.getLogger(__name__)
+
+EMPLOYEE_EXPORT_COLUMNS = [
+    ('e.id', 'ID'),
+    ('e.full_name', 'ФИО'),
+    ('e.email', 'Email'),
+    ('e.position', 'Должность'),
+    ('g.name', 'Группа'),
+    ('e.created_at', 'Создано')
+]
+
+def build_employee_export_query(query_params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    '''Export query and parameters for the request's group filter'''
+    group_filter = query_params.get('group_id')
+    query = f'''
+        SELECT {select_list(EMPLOYEE_EXPORT_COLUMNS)}
+        FROM employees e
+        LEFT JOIN employee_groups g ON e.group_id = g.id
+        WHERE 1=1
+    '''
+    params = []
+    
+    if group_filter and group_filter != 'all':
+        query += ' AND e.group_id = %s'
+        params.append(group_filter)
+    
+    return query + ' ORDER BY e.full_name ASC', params
+
+def get_db_connection(route: str = 'read'):
+    '''Get a pooled database connection using DATABASE_URL from environment, with the route's statement timeout'''
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         raise ValueError('DATABASE_URL environment variable is not set')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    return db_pool.acquire(
+        database_url,
+        STATEMENT_TIMEOUTS_MS[route],
+        cursor_factory=RealDictCursor,
+        connect_timeout=CONNECT_TIMEOUT_SECONDS
+    )
 
-def hash_password(password: str) -> str:
-    '''Simple password hashing using SHA256'''
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def generate_session_token() -> str:
-    '''Generate random session token'''
-    return secrets.token_urlsafe(32)
+def classify_route(event: Dict[str, Any]) -> str:
+    '''Map a request onto its rate limit budget so structure builds and logins cannot starve reads'''
+    method = event.get('httpMethod', 'GET')
+    resource = (event.get('queryStringParameters') or {}).get('resource', 'employees')
+    if resource == 'auth':
+        return 'auth'
+    if resource in ('department-structure', 'workload', 'export'):
+        return 'heavy'
+    return 'read' if method == 'GET' else 'write'
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -28,8 +112,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - object with request_id, function_name attributes
     Returns: HTTP response dict with employee/group/auth data or error
     '''
+    if event.get('httpMethod') == 'OPTIONS':
+        return route_request(event, context)
+    
+    if (event.get('queryStringParameters') or {}).get('resource') == 'metrics':
+        return metrics_response(db_breaker, rate_limiter, db_pool)
+    
+    route = classify_route(event)
+    rejection = rate_limiter.admit(event, route)
+    if rejection:
+        return rejection
+    
+    try:
+        if not db_breaker.allow():
+            return rejection_response(503, 'Database is temporarily unavailable', db_breaker.retry_after())
+        
+        try:
+            response = route_request(event, context)
+        except psycopg2.OperationalError:
+            db_breaker.record_failure()
+            return rejection_response(503, 'Database is unavailable, please retry later', db_breaker.retry_after())
+        
+        db_breaker.record_success()
+    finally:
+        rate_limiter.release(route)
+    
+    return compress_response(event, response)
+
+def route_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''Dispatch the request by HTTP method and build an uncompressed response'''
     method: str = event.get('httpMethod', 'GET')
     query_params = event.get('queryStringParameters') or {}
+    path_params = event.get('pathParams') or {}
     resource = query_params.get('resource', 'employees')
     
     if method == 'OPTIONS':
@@ -38,27 +152,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Session-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Role, X-Session-Token, Idempotency-Key, Range',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
-        conn = get_db_connection()
+        route = classify_route(event)
+        conn = get_db_connection(route)
+        rate_limited = rate_limiter.check_shared(conn, event, route)
+        if rate_limited:
+            conn.close()
+            return rate_limited
+        
         cur = conn.cursor()
         
         if resource == 'groups':
             if method == 'GET':
-                cur.execute('''
-                    SELECT g.id, g.name, g.description, g.created_at,
-                           COUNT(e.id) as employee_count
-                    FROM employee_groups g
-                    LEFT JOIN employees e ON e.group_id = g.id
-                    GROUP BY g.id, g.name, g.description, g.created_at
-                    ORDER BY g.name ASC
-                ''')
+                run(cur, GROUP_LIST)
                 groups = cur.fetchall()
                 
                 groups_list = []
@@ -100,10 +214,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(
-                    'INSERT INTO employee_groups (name, description) VALUES (%s, %s) RETURNING id, name, description, created_at',
-                    (name, description)
-                )
+                run(cur, GROUP_INSERT, (name, description))
                 new_group = cur.fetchone()
                 conn.commit()
                 
@@ -133,25 +244,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 query_params = event.get('queryStringParameters') or {}
                 group_filter = query_params.get('group_id')
                 
-                query = '''
-                    SELECT e.id, e.full_name, e.email, e.position, e.group_id, 
-                           e.created_at, g.name as group_name
-                    FROM employees e
-                    LEFT JOIN employee_groups g ON e.group_id = g.id
-                    WHERE 1=1
-                '''
-                params = []
+                try:
+                    position, limit = parse_employee_page(query_params)
+                except ValueError as e:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
                 
                 if group_filter and group_filter != 'all':
-                    query += ' AND e.group_id = %s'
-                    params.append(group_filter)
-                
-                query += ' ORDER BY e.full_name ASC'
-                
-                if params:
-                    cur.execute(query, params)
+                    run(cur, EMPLOYEE_LIST_BY_GROUP, (group_filter, position[0], position[1], limit))
                 else:
-                    cur.execute(query)
+                    run(cur, EMPLOYEE_LIST, (position[0], position[1], limit))
                 
                 employees = cur.fetchall()
                 
@@ -167,6 +278,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'createdAt': emp['created_at'].isoformat() if emp['created_at'] else None
                     })
                 
+                # Unpaged requests get the plain list they always got
+                body = {'employees': employees_list}
+                if limit is not None:
+                    has_more = len(employees_list) == limit
+                    body['nextAfter'] = employees_list[-1]['fullName'] if has_more else None
+                    body['nextAfterId'] = employees_list[-1]['id'] if has_more else None
+                
                 cur.close()
                 conn.close()
                 
@@ -176,7 +294,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Content-Type': 'application/json',
                         'Access-Control-Allow-Origin': '*'
                     },
-                    'body': json.dumps({'employees': employees_list}),
+                    'body': json.dumps(body),
                     'isBase64Encoded': False
                 }
             
@@ -198,18 +316,35 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(
-                    '''INSERT INTO employees (full_name, email, position, group_id) 
-                       VALUES (%s, %s, %s, %s) 
-                       RETURNING id, full_name, email, position, group_id, created_at''',
-                    (full_name, email, position, group_id if group_id else None)
-                )
+                idempotency_key = get_idempotency_key(event)
+                if idempotency_key:
+                    if len(idempotency_key) > MAX_KEY_LENGTH:
+                        cur.close()
+                        conn.close()
+                        return {
+                            'statusCode': 400,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'body': json.dumps({'error': 'Idempotency-Key is too long'}),
+                            'isBase64Encoded': False
+                        }
+                    
+                    request_hash = request_fingerprint(event)
+                    stored_response = acquire_idempotency_key(cur, 'employees', idempotency_key, request_hash)
+                    if stored_response:
+                        conn.commit()
+                        cur.close()
+                        conn.close()
+                        return stored_response
+                
+                run(cur, EMPLOYEE_INSERT, (full_name, email, position, group_id if group_id else None))
                 new_emp = cur.fetchone()
-                conn.commit()
                 
                 group_name = None
                 if new_emp['group_id']:
-                    cur.execute('SELECT name FROM employee_groups WHERE id = %s', (new_emp['group_id'],))
+                    run(cur, GROUP_NAME, (new_emp['group_id'],))
                     group_result = cur.fetchone()
                     if group_result:
                         group_name = group_result['name']
@@ -224,10 +359,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'createdAt': new_emp['created_at'].isoformat() if new_emp['created_at'] else None
                 }
                 
-                cur.close()
-                conn.close()
-                
-                return {
+                response = {
                     'statusCode': 201,
                     'headers': {
                         'Content-Type': 'application/json',
@@ -236,6 +368,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'employee': emp_data}),
                     'isBase64Encoded': False
                 }
+                
+                if idempotency_key:
+                    store_idempotent_response(cur, 'employees', idempotency_key, request_hash, response)
+                
+                conn.commit()
+                maybe_purge_expired_keys(conn)
+                
+                cur.close()
+                conn.close()
+                
+                return response
             
             elif method == 'PUT':
                 emp_id = path_params.get('id')
@@ -253,27 +396,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 body_data = json.loads(event.get('body', '{}'))
                 
-                update_fields = []
-                params = []
-                
-                if 'fullName' in body_data:
-                    update_fields.append('full_name = %s')
-                    params.append(body_data['fullName'])
-                if 'email' in body_data:
-                    update_fields.append('email = %s')
-                    params.append(body_data['email'])
-                if 'position' in body_data:
-                    update_fields.append('position = %s')
-                    params.append(body_data['position'])
-                if 'groupId' in body_data:
-                    update_fields.append('group_id = %s')
-                    params.append(body_data['groupId'] if body_data['groupId'] else None)
-                
-                params.append(emp_id)
-                
-                query = f"UPDATE employees SET {', '.join(update_fields)} WHERE id = %s RETURNING id, full_name, email, position, group_id, created_at"
-                
-                cur.execute(query, params)
+                run(cur, EMPLOYEE_UPDATE, employee_update_params(body_data) + [emp_id])
                 updated_emp = cur.fetchone()
                 
                 if not updated_emp:
@@ -293,7 +416,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 group_name = None
                 if updated_emp['group_id']:
-                    cur.execute('SELECT name FROM employee_groups WHERE id = %s', (updated_emp['group_id'],))
+                    run(cur, GROUP_NAME, (updated_emp['group_id'],))
                     group_result = cur.fetchone()
                     if group_result:
                         group_name = group_result['name']
@@ -335,7 +458,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute('DELETE FROM employees WHERE id = %s RETURNING id', (emp_id,))
+                run(cur, EMPLOYEE_DELETE, (emp_id,))
                 deleted = cur.fetchone()
                 
                 if not deleted:
@@ -389,10 +512,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(
-                    'UPDATE employee_groups SET name = %s, description = %s WHERE id = %s RETURNING id, name, description, created_at',
-                    (name, description, group_id)
-                )
+                run(cur, GROUP_UPDATE, (name, description, group_id))
                 updated = cur.fetchone()
                 
                 if not updated:
@@ -405,7 +525,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute('SELECT COUNT(*) as cnt FROM employees WHERE group_id = %s', (group_id,))
+                run(cur, GROUP_EMPLOYEE_COUNT, (group_id,))
                 cnt_row = cur.fetchone()
                 conn.commit()
                 cur.close()
@@ -438,8 +558,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute('UPDATE employees SET group_id = NULL WHERE group_id = %s', (group_id,))
-                cur.execute('DELETE FROM employee_groups WHERE id = %s RETURNING id', (group_id,))
+                run(cur, GROUP_RELEASE_EMPLOYEES, (group_id,))
+                run(cur, GROUP_DELETE, (group_id,))
                 deleted = cur.fetchone()
                 
                 if not deleted:
@@ -486,21 +606,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                password_hash = hash_password(password)
-                
-                cur.execute(
-                    '''SELECT u.id, u.username, u.full_name, u.role, u.employee_id,
-                              e.full_name as employee_name, e.position, e.group_id,
-                              g.name as group_name
-                       FROM users u
-                       LEFT JOIN employees e ON u.employee_id = e.id
-                       LEFT JOIN employee_groups g ON e.group_id = g.id
-                       WHERE u.username = %s AND u.password_hash = %s''',
-                    (username, password_hash)
-                )
+                run(cur, USER_LOGIN, (username,))
                 user = cur.fetchone()
+                stored_hash = user['password_hash'] if user else None
+                
+                try:
+                    password_valid = verify_password(password, stored_hash)
+                except TimeoutError:
+                    cur.close()
+                    conn.close()
+                    return rejection_response(503, 'Login is busy, please retry later', 1)
                 
-                if not user:
+                if not password_valid:
                     cur.close()
                     conn.close()
                     return {
@@ -513,13 +630,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(
-                    'UPDATE users SET last_login = NOW() WHERE id = %s',
-                    (user['id'],)
-                )
+                # A busy pool only postpones the upgrade to the next login
+                if needs_rehash(stored_hash):
+                    try:
+                        run(cur, USER_REHASH, (user['id'], rehash_password(password), stored_hash))
+                    except TimeoutError:
+                        pass
+                
+                run(cur, USER_TOUCH_LOGIN, (user['id'],))
                 conn.commit()
                 
-                session_token = generate_session_token()
+                session_token = issue_session_token(user['id'])
                 
                 user_data = {
                     'id': str(user['id']),
@@ -547,31 +668,81 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
         
+        elif resource == 'export':
+            if method == 'GET':
+                export_format = query_params.get('format', 'csv')
+                
+                if export_format not in ('csv', 'xlsx'):
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Unsupported export format'}),
+                        'isBase64Encoded': False
+                    }
+                
+                query, params = build_employee_export_query(query_params)
+                exported = export_query(conn, query, params, [label for _, label in EMPLOYEE_EXPORT_COLUMNS], export_format, 'Сотрудники')
+                
+                content_type = XLSX_CONTENT_TYPE if export_format == 'xlsx' else CSV_CONTENT_TYPE
+                file_name = f"employees-{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+                
+                if exported_size(exported) > MAX_INLINE_BYTES:
+                    response = store_export(cur, conn, exported, file_name, content_type)
+                else:
+                    response = file_response(exported, file_name, content_type)
+                
+                cur.close()
+                conn.close()
+                return response
+        
+        elif resource == 'downloads':
+            response = handle_download_request(cur, event)
+            
+            cur.close()
+            conn.close()
+            return response
+        
+        elif resource == 'workload':
+            if method == 'GET':
+                headers = event.get('headers') or {}
+                user_role = headers.get('X-User-Role') or headers.get('x-user-role')
+                
+                if user_role != 'department_head':
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 403,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Access denied: only department head can view the workload report'}),
+                        'isBase64Encoded': False
+                    }
+                
+                report = get_workload_report(cur, conn)
+                
+                cur.close()
+                conn.close()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': report,
+                    'isBase64Encoded': False
+                }
+        
         elif resource == 'department-structure':
             if method == 'GET':
-                cur.execute('''
-                    SELECT 
-                        g.id as group_id,
-                        g.name as group_name,
-                        g.description as group_description,
-                        g.manager_id,
-                        m.full_name as manager_name,
-                        m.position as manager_position,
-                        COUNT(e.id) as employee_count,
-                        json_agg(
-                            json_build_object(
-                                'id', e.id,
-                                'fullName', e.full_name,
-                                'position', e.position,
-                                'email', e.email
-                            ) ORDER BY e.full_name
-                        ) FILTER (WHERE e.id IS NOT NULL) as employees
-                    FROM employee_groups g
-                    LEFT JOIN employees m ON g.manager_id = m.id
-                    LEFT JOIN employees e ON e.group_id = g.id
-                    GROUP BY g.id, g.name, g.description, g.manager_id, m.full_name, m.position
-                    ORDER BY g.name
-                ''')
+                run(cur, DEPARTMENT_STRUCTURE)
                 
                 groups_data = cur.fetchall()
                 
@@ -613,13 +784,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    except Exception as e:
+    except psycopg2.OperationalError:
+        raise
+    
+    except Exception:
+        # Details go to the log only; the message may quote SQL or data
+        request_id = getattr(context, 'request_id', None)
+        logger.exception('Unhandled error in %s %s (request %s)', method, event.get('queryStringParameters'), request_id)
         return {
             'statusCode': 500,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': f'Internal server error: {str(e)}'}),
+            'body': json.dumps({'error': 'Internal server error', 'requestId': request_id}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    
+    finally:
+        # Branches that return early release the connection here; a second close is a no-op
+        if conn is not None:
+            conn.close()
\ No newline at end of file
@@ -0,0 +1,180 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+SALT_BYTES = 16
+VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS', '2'))
+VERIFY_TIMEOUT_SECONDS = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', '2'))
+
+LEGACY_SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+def b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+class ScryptHasher:
+    '''scrypt$n$r$p$salt$hash; memory-hard, preferred default'''
+
+    algorithm = 'scrypt'
+
+    def __init__(self, n: int = 2 ** 14, r: int = 8, p: int = 1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(SALT_BYTES)
+        derived = self.derive(password, salt, self.n, self.r, self.p)
+        return f'{self.algorithm}${self.n}${self.r}${self.p}${b64encode(salt)}${b64encode(derived)}'
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, n, r, p, salt, expected = encoded.split('$')
+        derived = self.derive(password, b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(derived, b64decode(expected))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split('$')[1:4] != [str(self.n), str(self.r), str(self.p)]
+
+class Pbkdf2Hasher:
+    '''pbkdf2_sha256$iterations$salt$hash; for runtimes where scrypt memory is constrained'''
+
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, iterations: int = 600000):
+        self.iterations = iterations
+
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(SALT_BYTES)
+        derived = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, self.iterations)
+        return f'{self.algorithm}${self.iterations}${b64encode(salt)}${b64encode(derived)}'
+
+    def verify(self, password: str, encoded: str) -> bool:
+        _, iterations, salt, expected = encoded.split('$')
+        derived = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), b64decode(salt), int(iterations))
+        return hmac.compare_digest(derived, b64decode(expected))
+
+    def needs_rehash(self, encoded: str) -> bool:
+        return encoded.split('$')[1] != str(self.iterations)
+
+HASHERS = {
+    ScryptHasher.algorithm: ScryptHasher,
+    Pbkdf2Hasher.algorithm: Pbkdf2Hasher
+}
+
+def configured_hasher():
+    '''Hasher for new hashes, e.g. PASSWORD_HASHER=scrypt PASSWORD_HASH_COST=16384 (n) or pbkdf2_sha256 with iterations'''
+    algorithm = os.environ.get('PASSWORD_HASHER', ScryptHasher.algorithm)
+    cost = os.environ.get('PASSWORD_HASH_COST')
+    if algorithm == Pbkdf2Hasher.algorithm:
+        return Pbkdf2Hasher(int(cost)) if cost else Pbkdf2Hasher()
+    return ScryptHasher(int(cost)) if cost else ScryptHasher()
+
+current_hasher = configured_hasher()
+
+# Verified when the username does not exist, so unknown and known users take equally long
+DUMMY_HASH = current_hasher.hash(secrets.token_urlsafe(16))
+
+_verify_pool = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix='password-verify')
+
+def hash_password(password: str) -> str:
+    return current_hasher.hash(password)
+
+def check_password(password: str, encoded: str) -> bool:
+    '''
+    Compare against a stored hash of any supported format, including legacy
+    unsalted SHA-256. Legacy and unreadable hashes also pay for a dummy
+    verification, so they take as long as a current one.
+    '''
+    if LEGACY_SHA256_PATTERN.match(encoded):
+        current_hasher.verify(password, DUMMY_HASH)
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), encoded)
+
+    hasher_class = HASHERS.get(encoded.split('$', 1)[0])
+    if not hasher_class:
+        current_hasher.verify(password, DUMMY_HASH)
+        return False
+    try:
+        return hasher_class().verify(password, encoded)
+    except ValueError:
+        return False
+
+def needs_rehash(encoded: str) -> bool:
+    '''Legacy hashes, other algorithms and outdated cost parameters are replaced after a successful login'''
+    if not encoded.startswith(current_hasher.algorithm + '$'):
+        return True
+    return current_hasher.needs_rehash(encoded)
+
+def verify_password(password: str, encoded: Optional[str]) -> bool:
+    '''
+    Verify on a small dedicated thread pool. Concurrent logins queue for a
+    worker instead of all competing for CPU at once, which keeps login
+    latency bounded; a verification that cannot start and finish within
+    VERIFY_TIMEOUT_SECONDS raises TimeoutError.
+    '''
+    future = _verify_pool.submit(check_password, password, encoded or DUMMY_HASH)
+    try:
+        matched = future.result(timeout=VERIFY_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError('Password verification timed out')
+    return matched and encoded is not None
+
+def rehash_password(password: str) -> str:
+    '''
+    Hash with the current parameters on the verification pool, so a rehash
+    after login queues like a verification instead of competing for CPU;
+    raises TimeoutError like verify_password.
+    '''
+    future = _verify_pool.submit(hash_password, password)
+    try:
+        return future.result(timeout=VERIFY_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        raise TimeoutError('Password hashing timed out')
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    print(f'Calibrating hash cost for ~{target_ms:.0f} ms per verification')
+
+    def measure(hasher, rounds: int = 3) -> float:
+        encoded = hasher.hash('calibration-password')
+        started = time.perf_counter()
+        for _ in range(rounds):
+            hasher.verify('calibration-password', encoded)
+        return (time.perf_counter() - started) / rounds * 1000
+
+    n = 2 ** 12
+    while True:
+        elapsed = measure(ScryptHasher(n))
+        print(f'  scrypt n={n:<8} {elapsed:7.1f} ms')
+        if elapsed * 2 > target_ms or n >= 2 ** 20:
+            break
+        n *= 2
+    scrypt_n = n
+
+    iterations = 100000
+    elapsed = measure(Pbkdf2Hasher(iterations))
+    iterations = int(iterations * target_ms / elapsed) // 10000 * 10000 or 10000
+    elapsed = measure(Pbkdf2Hasher(iterations))
+    print(f'  pbkdf2_sha256 iterations={iterations} {elapsed:7.1f} ms')
+
+    print('Recommended settings:')
+    print(f'  PASSWORD_HASHER=scrypt PASSWORD_HASH_COST={scrypt_n}')
+    print(f'  PASSWORD_HASHER=pbkdf2_sha256 PASSWORD_HASH_COST={iterations}')
+
+    started = time.perf_counter()
+    check_password('calibration-password', hashlib.sha256(b'calibration-password').hexdigest())
+    print(f'Legacy SHA-256 check, padded with a dummy verification: {(time.perf_counter() - started) * 1000:.3f} ms')
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from statements import Statement
+
+EMPLOYEE_COLUMNS = 'id, full_name, email, position, group_id, created_at'
+
+EMPLOYEE_UPDATABLE_FIELDS = [
+    ('fullName', 'full_name'),
+    ('email', 'email'),
+    ('position', 'position'),
+    ('groupId', 'group_id')
+]
+
+EMPLOYEE_LIST_SQL = '''
+    SELECT e.id, e.full_name, e.email, e.position, e.group_id,
+           e.created_at, g.name as group_name
+    FROM employees e
+    LEFT JOIN employee_groups g ON e.group_id = g.id'''
+
+EMPLOYEE_MAX_PAGE_SIZE = 1000
+
+# Position before the first employee of any list
+FIRST_PAGE_POSITION = ('', 0)
+
+# Both lists read after a (full_name, id) position up to a limit, a NULL
+# limit reads to the end
+EMPLOYEE_LIST = Statement('employee_list', EMPLOYEE_LIST_SQL + '''
+    WHERE (e.full_name, e.id) > ($1, $2)
+    ORDER BY e.full_name ASC, e.id ASC LIMIT $3''')
+
+EMPLOYEE_LIST_BY_GROUP = Statement('employee_list_by_group', EMPLOYEE_LIST_SQL + '''
+    WHERE e.group_id = $1 AND (e.full_name, e.id) > ($2, $3)
+    ORDER BY e.full_name ASC, e.id ASC LIMIT $4''')
+
+EMPLOYEE_INSERT = Statement('employee_insert', f'''
+    INSERT INTO employees (full_name, email, position, group_id)
+    VALUES ($1, $2, $3, $4)
+    RETURNING {EMPLOYEE_COLUMNS}''')
+
+# Every PUT runs the same statement: each column gets a "was it sent" flag
+# and a value, and keeps its current value when the flag is false.
+EMPLOYEE_UPDATE = Statement('employee_update', 'UPDATE employees SET ' + ', '.join(
+    f'{column} = CASE WHEN ${index * 2 + 1} THEN ${index * 2 + 2} ELSE {column} END'
+    for index, (_, column) in enumerate(EMPLOYEE_UPDATABLE_FIELDS)
+) + f' WHERE id = ${len(EMPLOYEE_UPDATABLE_FIELDS) * 2 + 1} RETURNING {EMPLOYEE_COLUMNS}')
+
+EMPLOYEE_DELETE = Statement('employee_delete', 'DELETE FROM employees WHERE id = $1 RETURNING id')
+
+GROUP_NAME = Statement('group_name', 'SELECT name FROM employee_groups WHERE id = $1')
+
+GROUP_LIST = Statement('group_list', '''
+    SELECT g.id, g.name, g.description, g.created_at,
+           COUNT(e.id) as employee_count
+    FROM employee_groups g
+    LEFT JOIN employees e ON e.group_id = g.id
+    GROUP BY g.id, g.name, g.description, g.created_at
+    ORDER BY g.name ASC''')
+
+GROUP_INSERT = Statement('group_insert', '''
+    INSERT INTO employee_groups (name, description) VALUES ($1, $2)
+    RETURNING id, name, description, created_at''')
+
+GROUP_UPDATE = Statement('group_update', '''
+    UPDATE employee_groups SET name = $1, description = $2 WHERE id = $3
+    RETURNING id, name, description, created_at''')
+
+GROUP_EMPLOYEE_COUNT = Statement('group_employee_count', 'SELECT COUNT(*) as cnt FROM employees WHERE group_id = $1')
+
+# A group is deleted after its employees are moved out of it
+GROUP_RELEASE_EMPLOYEES = Statement('group_release_employees', 'UPDATE employees SET group_id = NULL WHERE group_id = $1')
+
+GROUP_DELETE = Statement('group_delete', 'DELETE FROM employee_groups WHERE id = $1 RETURNING id')
+
+USER_LOGIN = Statement('user_login', '''
+    SELECT u.id, u.username, u.full_name, u.role, u.employee_id,
+           e.full_name as employee_name, e.position, e.group_id,
+           g.name as group_name, u.password_hash
+    FROM users u
+    LEFT JOIN employees e ON u.employee_id = e.id
+    LEFT JOIN employee_groups g ON e.group_id = g.id
+    WHERE u.username = $1''')
+
+USER_TOUCH_LOGIN = Statement('user_touch_login', 'UPDATE users SET last_login = NOW() WHERE id = $1')
+
+# Replaces a legacy or outdated hash only if no concurrent login has already done so
+USER_REHASH = Statement('user_rehash', 'UPDATE users SET password_hash = $2 WHERE id = $1 AND password_hash = $3')
+
+DEPARTMENT_STRUCTURE = Statement('department_structure', '''
+    SELECT 
+        g.id as group_id,
+        g.name as group_name,
+        g.description as group_description,
+        g.manager_id,
+        m.full_name as manager_name,
+        m.position as manager_position,
+        COUNT(e.id) as employee_count,
+        json_agg(
+            json_build_object(
+                'id', e.id,
+                'fullName', e.full_name,
+                'position', e.position,
+                'email', e.email
+            ) ORDER BY e.full_name
+        ) FILTER (WHERE e.id IS NOT NULL) as employees
+    FROM employee_groups g
+    LEFT JOIN employees m ON g.manager_id = m.id
+    LEFT JOIN employees e ON e.group_id = g.id
+    GROUP BY g.id, g.name, g.description, g.manager_id, m.full_name, m.position
+    ORDER BY g.name''')
+
+def parse_employee_page(query_params: Dict[str, Any]) -> Tuple[Tuple[str, int], Optional[int]]:
+    '''
+    Validate the optional paging parameters of an employee list: limit
+    between 1 and EMPLOYEE_MAX_PAGE_SIZE, and an after/afterId position
+    taken from the previous page. Without a limit the whole list is
+    returned, as before paging existed. Raises ValueError on anything else.
+    '''
+    limit = query_params.get('limit')
+    if limit is not None and (not limit.isdigit() or not 1 <= int(limit) <= EMPLOYEE_MAX_PAGE_SIZE):
+        raise ValueError(f'limit must be an integer between 1 and {EMPLOYEE_MAX_PAGE_SIZE}')
+    limit = int(limit) if limit is not None else None
+
+    after = query_params.get('after')
+    after_id = query_params.get('afterId')
+    if after is None and not after_id:
+        return FIRST_PAGE_POSITION, limit
+    if after is None or not after_id or not after_id.isdigit():
+        raise ValueError('after and afterId must be given together, as returned in nextAfter and nextAfterId')
+    return (after, int(after_id)), limit
+
+def employee_update_params(body_data: Dict[str, Any]) -> List[Any]:
+    '''Flag/value pairs for EMPLOYEE_UPDATE in EMPLOYEE_UPDATABLE_FIELDS order; an empty groupId clears the group'''
+    params = []
+    for key, _ in EMPLOYEE_UPDATABLE_FIELDS:
+        value = body_data.get(key)
+        if key == 'groupId' and not value:
+            value = None
+        params.extend([key in body_data, value])
+    return params
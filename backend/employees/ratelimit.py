@@ -0,0 +1,177 @@
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from sessions import session_user_id
+from statements import Statement, run
+
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', '16'))
+MAX_TRACKED_CLIENTS = 10000
+SHARED_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+# A bucket idle this long has refilled completely and can be forgotten
+BUCKET_IDLE_TTL = '10 minutes'
+PURGE_BATCH_SIZE = 500
+PURGE_PROBABILITY = 0.02
+
+# Refill the bucket for the time since its last update and take one cost
+# from it; no row comes back when the refilled bucket cannot cover the cost.
+# Parameters: bucket key, capacity, cost, refill per second.
+BUCKET_TAKE = Statement('rate_limit_bucket_take', '''
+    INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+    VALUES ($1, $2::float8 - $3::float8, clock_timestamp())
+    ON CONFLICT (bucket_key) DO UPDATE SET
+        tokens = LEAST($2::float8, rate_limit_buckets.tokens
+            + EXTRACT(EPOCH FROM clock_timestamp() - rate_limit_buckets.updated_at) * $4::float8) - $3::float8,
+        updated_at = clock_timestamp()
+    WHERE LEAST($2::float8, rate_limit_buckets.tokens
+            + EXTRACT(EPOCH FROM clock_timestamp() - rate_limit_buckets.updated_at) * $4::float8) >= $3::float8
+    RETURNING tokens''')
+
+BUCKET_PURGE = Statement('rate_limit_bucket_purge', f'''
+    DELETE FROM rate_limit_buckets
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM rate_limit_buckets
+        WHERE updated_at < clock_timestamp() - INTERVAL '{BUCKET_IDLE_TTL}'
+        LIMIT $1
+    ))''')
+
+class RouteBudget:
+    '''Token bucket size, refill rate and concurrency share for one class of routes'''
+
+    def __init__(self, capacity: float, refill_per_second: float, max_concurrency: int, cost: float = 1.0):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_concurrency = max_concurrency
+        self.cost = cost
+
+DEFAULT_BUDGETS: Dict[str, RouteBudget] = {
+    'read': RouteBudget(capacity=30, refill_per_second=10, max_concurrency=10),
+    'write': RouteBudget(capacity=10, refill_per_second=2, max_concurrency=6),
+    'heavy': RouteBudget(capacity=6, refill_per_second=0.5, max_concurrency=2),
+    'auth': RouteBudget(capacity=10, refill_per_second=1, max_concurrency=4)
+}
+
+def get_client_key(event: Dict[str, Any]) -> str:
+    '''
+    Identify the caller by the user of a signed session token, so colleagues
+    behind one office NAT do not share a bucket. Requests without a valid
+    token fall back to the source IP the gateway saw; unsigned identity
+    headers are never used, since a client could pick a fresh bucket per
+    request. The key is hashed, so bucket keys have a fixed length and
+    rate_limit_buckets stores no client addresses.
+    '''
+    user_id = session_user_id(event)
+    if user_id:
+        return hashlib.sha256(f'user:{user_id}'.encode('utf-8')).hexdigest()
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    source_ip = identity.get('sourceIp') or 'unknown'
+    return hashlib.sha256(f'ip:{source_ip}'.encode('utf-8')).hexdigest()
+
+def purge_stale_buckets(cur, batch_size: int = PURGE_BATCH_SIZE) -> int:
+    '''Delete one bounded batch of idle buckets and return how many were removed'''
+    run(cur, BUCKET_PURGE, (batch_size,))
+    return cur.rowcount
+
+def rejection_response(status_code: int, message: str, retry_after: float) -> Dict[str, Any]:
+    '''Build a 429/503 response with a Retry-After hint in whole seconds'''
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Retry-After',
+            'Retry-After': str(max(1, math.ceil(retry_after)))
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+class RateLimiter:
+    '''
+    Admission control in front of the database: a global in-flight cap,
+    per-route concurrency shares and per-client token buckets per route
+    class, so a client hammering expensive routes cannot starve cheap reads.
+    Buckets live in process memory; with RATE_LIMIT_STORE=postgres they are
+    additionally enforced across instances through rate_limit_buckets.
+    '''
+
+    def __init__(self, budgets: Dict[str, RouteBudget], max_in_flight: int = MAX_IN_FLIGHT):
+        self.budgets = budgets
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.route_in_flight = {route: 0 for route in budgets}
+        self.buckets: 'OrderedDict[Tuple[str, str], Tuple[float, float]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _take_token(self, bucket_key: Tuple[str, str], budget: RouteBudget, now: float) -> float:
+        '''Consume a token from an in-memory bucket; returns seconds to wait, 0 if admitted'''
+        tokens, updated = self.buckets.get(bucket_key, (budget.capacity, now))
+        tokens = min(budget.capacity, tokens + (now - updated) * budget.refill_per_second)
+
+        if tokens < budget.cost:
+            self.buckets[bucket_key] = (tokens, now)
+            self.buckets.move_to_end(bucket_key)
+            return (budget.cost - tokens) / budget.refill_per_second
+
+        self.buckets[bucket_key] = (tokens - budget.cost, now)
+        self.buckets.move_to_end(bucket_key)
+        if len(self.buckets) > MAX_TRACKED_CLIENTS:
+            self.buckets.popitem(last=False)
+        return 0.0
+
+    def admit(self, event: Dict[str, Any], route: str) -> Optional[Dict[str, Any]]:
+        '''Admit the request or return the rejection response to send instead'''
+        budget = self.budgets[route]
+        now = time.monotonic()
+
+        with self.lock:
+            if self.in_flight >= self.max_in_flight or self.route_in_flight[route] >= budget.max_concurrency:
+                return rejection_response(503, 'Server is busy, please retry later', 1)
+
+            wait_seconds = self._take_token((get_client_key(event), route), budget, now)
+            if wait_seconds > 0:
+                return rejection_response(429, 'Too many requests', wait_seconds)
+
+            self.in_flight += 1
+            self.route_in_flight[route] += 1
+        return None
+
+    def release(self, route: str) -> None:
+        '''Return the concurrency slot taken by admit'''
+        with self.lock:
+            self.in_flight -= 1
+            self.route_in_flight[route] -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'inFlight': self.in_flight,
+                'routeInFlight': dict(self.route_in_flight),
+                'trackedClients': len(self.buckets)
+            }
+
+    def check_shared(self, conn, event: Dict[str, Any], route: str) -> Optional[Dict[str, Any]]:
+        '''Enforce the bucket across instances with an atomic upsert in Postgres'''
+        if SHARED_STORE != 'postgres':
+            return None
+
+        budget = self.budgets[route]
+        bucket_key = f'{get_client_key(event)}:{route}'
+        cur = conn.cursor()
+        run(cur, BUCKET_TAKE, (bucket_key, budget.capacity, budget.cost, budget.refill_per_second))
+        admitted = cur.fetchone()
+        conn.commit()
+        if random.random() < PURGE_PROBABILITY:
+            purge_stale_buckets(cur)
+            conn.commit()
+        cur.close()
+
+        if admitted:
+            return None
+        return rejection_response(429, 'Too many requests', budget.cost / budget.refill_per_second)
@@ -0,0 +1,23 @@
+import json
+from typing import Dict, Any, Optional
+
+# A function response may not exceed 3.5 MB, and a binary body travels as
+# base64, which grows it by a third. A raw body up to MAX_RAW_BODY_BYTES
+# still fits once encoded, with room left for the headers.
+MAX_RESPONSE_SIZE = 3500000
+MAX_RAW_BODY_BYTES = (MAX_RESPONSE_SIZE - 64 * 1024) // 4 * 3
+
+def json_response(status_code: int, payload: Dict[str, Any], extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''JSON response with the CORS header every handler response carries'''
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+    return {
+        'statusCode': status_code,
+        'headers': headers,
+        'body': json.dumps(payload),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,192 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+
+POOL_MAX_IDLE = int(os.environ.get('DB_POOL_MAX_IDLE', '4'))
+POOL_MAX_IDLE_SECONDS = 300
+
+PARAMETER_PATTERN = re.compile(r'\$(\d+)')
+
+class Statement:
+    '''
+    One fixed SQL shape, named once. The text uses $1..$n placeholders and
+    is PREPAREd on first use per connection, then run with EXECUTE so the
+    server skips parsing and planning on the hot path.
+    '''
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        numbers = [int(number) for number in PARAMETER_PATTERN.findall(sql)]
+        self.param_count = max(numbers) if numbers else 0
+        arguments = ', '.join(['%s'] * self.param_count)
+        self.execute_sql = f'EXECUTE {name}({arguments})' if arguments else f'EXECUTE {name}'
+        self.plain_sql = PARAMETER_PATTERN.sub(lambda match: f'%(p{match.group(1)})s', sql)
+
+def number_placeholders(sql: str) -> str:
+    '''Turn sequential %s placeholders of an existing query builder into $1..$n'''
+    parts = sql.split('%s')
+    numbered = [parts[0]]
+    for number, part in enumerate(parts[1:], 1):
+        numbered.append(f'${number}{part}')
+    return ''.join(numbered)
+
+def run(cur, statement: Statement, params: Sequence[Any] = ()) -> None:
+    '''Execute a registered statement, preparing it on this connection first if needed'''
+    prepared = getattr(cur.connection, 'prepared', None)
+    if prepared is None:
+        cur.execute(statement.plain_sql, {f'p{index}': value for index, value in enumerate(params, 1)})
+        return
+
+    if statement.name not in prepared:
+        cur.execute(f'PREPARE {statement.name} AS {statement.sql}')
+        prepared.add(statement.name)
+    cur.execute(statement.execute_sql, tuple(params))
+
+class PooledConnection(psycopg2.extensions.connection):
+    '''
+    Connection that goes back to its pool on close() instead of
+    disconnecting, remembering which statements it has prepared and which
+    statement_timeout it runs with. Closing it again before the next
+    checkout does nothing.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool: Optional['ConnectionPool'] = None
+        self.prepared = set()
+        self.statement_timeout: Optional[int] = None
+        self.released_at = 0.0
+        self.checked_out = False
+
+    def close(self) -> None:
+        if self.pool is None or self.closed:
+            super().close()
+            return
+        if self.checked_out:
+            self.checked_out = False
+            self.pool.release(self)
+
+    def disconnect(self) -> None:
+        super().close()
+
+class ConnectionPool:
+    '''
+    Minimal pool of idle connections kept across invocations of a warm
+    function instance. Connections are checked out per request and
+    returned by close(); broken, stale or surplus ones are disconnected.
+    '''
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, max_idle_seconds: float = POOL_MAX_IDLE_SECONDS):
+        self.max_idle = max_idle
+        self.max_idle_seconds = max_idle_seconds
+        self.idle: List[PooledConnection] = []
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.reuses = 0
+
+    def acquire(self, dsn: str, statement_timeout: int, **connect_kwargs) -> PooledConnection:
+        now = time.monotonic()
+        conn = None
+        with self.lock:
+            while self.idle:
+                candidate = self.idle.pop()
+                if not candidate.closed and now - candidate.released_at < self.max_idle_seconds:
+                    conn = candidate
+                    self.reuses += 1
+                    break
+                candidate.disconnect()
+
+        if conn is None:
+            conn = psycopg2.connect(dsn, connection_factory=PooledConnection, **connect_kwargs)
+            conn.pool = self
+            self.connects += 1
+
+        if conn.statement_timeout != statement_timeout:
+            cur = conn.cursor()
+            cur.execute('SET statement_timeout = %s', (statement_timeout,))
+            cur.close()
+            conn.commit()
+            conn.statement_timeout = statement_timeout
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        '''Roll back whatever the request left open and park the connection'''
+        try:
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+        except psycopg2.Error:
+            conn.disconnect()
+            return
+
+        conn.released_at = time.monotonic()
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.disconnect()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'idle': len(self.idle), 'connects': self.connects, 'reuses': self.reuses}
+
+if __name__ == '__main__':
+    import sys
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('Set DATABASE_URL to run the prepared statement benchmark')
+
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    benchmarks = [
+        Statement('bench_login', '''
+            SELECT u.id, u.username, u.full_name, u.role, u.employee_id,
+                   e.full_name AS employee_name, e.position, e.group_id, g.name AS group_name
+            FROM users u
+            LEFT JOIN employees e ON u.employee_id = e.id
+            LEFT JOIN employee_groups g ON e.group_id = g.id
+            WHERE u.username = $1'''),
+        Statement('bench_structure', '''
+            SELECT g.id, g.name, m.full_name, COUNT(e.id) AS employee_count,
+                   json_agg(json_build_object('id', e.id, 'fullName', e.full_name) ORDER BY e.full_name)
+                       FILTER (WHERE e.id IS NOT NULL) AS employees
+            FROM employee_groups g
+            LEFT JOIN employees m ON g.manager_id = m.id
+            LEFT JOIN employees e ON e.group_id = g.id
+            GROUP BY g.id, g.name, m.full_name
+            ORDER BY g.name'''),
+        Statement('bench_tasks', '''
+            SELECT id, title, description, status, priority, assignee, due_date, created_at, updated_at, attachments
+            FROM tasks WHERE status = $1 ORDER BY due_date ASC''')
+    ]
+    sample_params = {'bench_login': ('admin',), 'bench_structure': (), 'bench_tasks': ('pending',)}
+
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+    for statement in benchmarks:
+        params = sample_params[statement.name]
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            cur.execute(statement.plain_sql, {f'p{index}': value for index, value in enumerate(params, 1)})
+            cur.fetchall()
+        plain = time.perf_counter() - started
+
+        cur.execute(f'PREPARE {statement.name} AS {statement.sql}')
+        started = time.perf_counter()
+        for _ in range(iterations):
+            cur.execute(statement.execute_sql, params)
+            cur.fetchall()
+        prepared_time = time.perf_counter() - started
+
+        print(f'{statement.name:>16}: plain {plain / iterations * 1e6:7.0f} us/query, '
+              f'prepared {prepared_time / iterations * 1e6:7.0f} us/query '
+              f'({(1 - prepared_time / plain) * 100:4.1f}% less)')
+    conn.rollback()
+    conn.close()
@@ -0,0 +1,140 @@
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from statements import Statement, run
+
+PRIORITY_WEIGHTS = {'high': 3, 'medium': 2, 'low': 1}
+CACHE_TTL_SECONDS = 60
+CACHE_KEY = 'workload'
+
+_local_cache: Dict[str, Tuple[str, float, str]] = {}
+
+# Open tasks are first reduced to one row per employee, so the grouping
+# sets only have to sort employees rather than every joined task row.
+WORKLOAD_QUERY = f'''
+    WITH employee_load AS (
+        SELECT
+            employee_id,
+            COUNT(*) AS open_tasks,
+            SUM(CASE priority {' '.join(f"WHEN '{name}' THEN {weight}" for name, weight in PRIORITY_WEIGHTS.items())} ELSE 0 END) AS weighted_load,
+            COUNT(*) FILTER (WHERE due_date < NOW()) AS overdue,
+            COUNT(*) FILTER (
+                WHERE due_date >= NOW() AND due_date < date_trunc('week', NOW()) + INTERVAL '1 week'
+            ) AS this_week,
+            COUNT(*) FILTER (WHERE due_date >= date_trunc('week', NOW()) + INTERVAL '1 week') AS later
+        FROM tasks
+        WHERE status <> 'completed' AND employee_id IS NOT NULL
+        GROUP BY employee_id
+    )
+    SELECT
+        g.id AS group_id,
+        g.name AS group_name,
+        e.id AS employee_id,
+        e.full_name,
+        e.position,
+        GROUPING(e.id) AS is_group_total,
+        COALESCE(SUM(l.open_tasks), 0)::bigint AS open_tasks,
+        COALESCE(SUM(l.weighted_load), 0)::bigint AS weighted_load,
+        COALESCE(SUM(l.overdue), 0)::bigint AS overdue,
+        COALESCE(SUM(l.this_week), 0)::bigint AS this_week,
+        COALESCE(SUM(l.later), 0)::bigint AS later
+    FROM employees e
+    LEFT JOIN employee_groups g ON g.id = e.group_id
+    LEFT JOIN employee_load l ON l.employee_id = e.id
+    GROUP BY GROUPING SETS ((g.id, g.name, e.id, e.full_name, e.position), (g.id, g.name))
+    ORDER BY g.name NULLS LAST, GROUPING(e.id) DESC, weighted_load DESC, e.full_name
+'''
+
+WORKLOAD = Statement('workload_report', WORKLOAD_QUERY)
+
+DATA_VERSION = Statement('data_version', '''
+    SELECT (SELECT last_value FROM tasks_data_version) AS tasks_version,
+           (SELECT last_value FROM employees_data_version) AS employees_version''')
+
+REPORT_CACHE_LOOKUP = Statement('report_cache_lookup', '''
+    SELECT payload FROM report_cache
+    WHERE cache_key = $1 AND data_version = $2
+      AND computed_at > NOW() - make_interval(secs => $3)''')
+
+REPORT_CACHE_STORE = Statement('report_cache_store', '''
+    INSERT INTO report_cache (cache_key, data_version, payload, computed_at)
+    VALUES ($1, $2, $3, NOW())
+    ON CONFLICT (cache_key) DO UPDATE SET
+        data_version = EXCLUDED.data_version,
+        payload = EXCLUDED.payload,
+        computed_at = EXCLUDED.computed_at''')
+
+def load_counts(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'openTasks': row['open_tasks'],
+        'weightedLoad': int(row['weighted_load']),
+        'overdue': row['overdue'],
+        'thisWeek': row['this_week'],
+        'later': row['later']
+    }
+
+def compute_workload(cur) -> List[Dict[str, Any]]:
+    '''
+    Open task load per employee and per group from a single grouped query:
+    GROUPING SETS yields employee rows and group subtotal rows together.
+    '''
+    run(cur, WORKLOAD)
+
+    groups: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for row in cur.fetchall():
+        if row['is_group_total']:
+            current = {
+                'groupId': str(row['group_id']) if row['group_id'] else None,
+                'groupName': row['group_name'],
+                **load_counts(row),
+                'employees': []
+            }
+            groups.append(current)
+        elif current is not None:
+            current['employees'].append({
+                'employeeId': str(row['employee_id']),
+                'fullName': row['full_name'],
+                'position': row['position'],
+                **load_counts(row)
+            })
+    return groups
+
+def current_data_version(cur) -> str:
+    '''
+    Version stamp that changes whenever tasks, employees or groups are
+    written. The sequences are bumped by deferred triggers as the writing
+    transaction commits, so concurrent writers never wait on each other and
+    a new version shows up no earlier than the commit of its data.
+    '''
+    run(cur, DATA_VERSION)
+    versions = cur.fetchone()
+    return f"{versions['tasks_version']}:{versions['employees_version']}"
+
+def get_workload_report(cur, conn) -> str:
+    '''
+    Workload report JSON, served from the in-process cache, then the shared
+    report_cache table, and only then recomputed. Entries are valid while
+    the data version is unchanged and for at most CACHE_TTL_SECONDS, since
+    due-date buckets shift with time even without writes.
+    '''
+    data_version = current_data_version(cur)
+    now = time.monotonic()
+
+    cached = _local_cache.get(CACHE_KEY)
+    if cached and cached[0] == data_version and now - cached[1] < CACHE_TTL_SECONDS:
+        return cached[2]
+
+    run(cur, REPORT_CACHE_LOOKUP, (CACHE_KEY, data_version, CACHE_TTL_SECONDS))
+    shared = cur.fetchone()
+    if shared:
+        _local_cache[CACHE_KEY] = (data_version, now, shared['payload'])
+        return shared['payload']
+
+    payload = json.dumps({'workload': compute_workload(cur)})
+    run(cur, REPORT_CACHE_STORE, (CACHE_KEY, data_version, payload))
+    conn.commit()
+
+    _local_cache[CACHE_KEY] = (data_version, now, payload)
+    return payload
@@ -0,0 +1,83 @@
+import os
+from datetime import date
+from typing import Dict, Any
+
+from history import PARTITIONS_ENSURE
+from statements import Statement, run
+
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_MAX_BATCHES = 50
+PARTITION_MONTHS_AHEAD = 3
+
+ARCHIVE_COLUMNS = ('id, title, description, status, priority, assignee, employee_id, due_date, created_at, updated_at, '
+                   'attachments, template_id, occurrence_date')
+
+# First month holding a task due for archiving (or the current one) and
+# the last month that needs a partition ahead
+ARCHIVE_BOUNDS = Statement('archive_bounds', '''
+    SELECT LEAST(
+               (SELECT MIN(due_date) FROM tasks
+                WHERE status = 'completed' AND due_date < NOW() - make_interval(days => $1)),
+               NOW()
+           )::date AS first_month,
+           (NOW() + make_interval(months => $2))::date AS last_month''')
+
+# One batch: a DELETE ... RETURNING feeding the INSERT into the archive.
+# The ids are collected into an array first, so the DELETE looks them up
+# by primary key instead of hash-joining against the whole table.
+ARCHIVE_BATCH = Statement('archive_batch', f'''
+    WITH moved AS (
+        DELETE FROM tasks
+        WHERE id = ANY(ARRAY(
+            SELECT id FROM tasks
+            WHERE status = 'completed' AND due_date < NOW() - make_interval(days => $1)
+            ORDER BY due_date
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING {ARCHIVE_COLUMNS}
+    )
+    INSERT INTO tasks_archive ({ARCHIVE_COLUMNS})
+    SELECT {ARCHIVE_COLUMNS} FROM moved''')
+
+def months_between(start: date, end: date) -> int:
+    '''Number of calendar months from start's month to end's month, inclusive'''
+    return (end.year - start.year) * 12 + (end.month - start.month) + 1
+
+def ensure_archive_partitions(cur, retention_days: int = ARCHIVE_RETENTION_DAYS,
+                              months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    '''
+    Create monthly archive partitions covering every completed task that is
+    about to be archived, plus months_ahead future months. Partitions must
+    exist before rows for their range land in the default partition.
+    '''
+    run(cur, ARCHIVE_BOUNDS, (retention_days, months_ahead))
+    bounds = cur.fetchone()
+    month_count = months_between(bounds['first_month'], bounds['last_month'])
+    run(cur, PARTITIONS_ENSURE, ('tasks_archive', bounds['first_month'], month_count))
+    return cur.fetchone()['created']
+
+def archive_completed_tasks(conn, retention_days: int = ARCHIVE_RETENTION_DAYS,
+                            batch_size: int = ARCHIVE_BATCH_SIZE,
+                            max_batches: int = ARCHIVE_MAX_BATCHES) -> Dict[str, Any]:
+    '''
+    Move completed tasks older than the retention window into tasks_archive.
+    Each batch is a single DELETE ... RETURNING feeding an INSERT and commits
+    on its own, so locks stay short and a run can be interrupted safely.
+    '''
+    cur = conn.cursor()
+    partitions_created = ensure_archive_partitions(cur, retention_days)
+    conn.commit()
+
+    archived = 0
+    for _ in range(max_batches):
+        run(cur, ARCHIVE_BATCH, (retention_days, batch_size))
+        moved = cur.rowcount
+        conn.commit()
+        archived += moved
+        if moved < batch_size:
+            break
+
+    cur.close()
+    return {'archived': archived, 'partitionsCreated': partitions_created}
@@ -0,0 +1,236 @@
+import base64
+import binascii
+import json
+import os
+import uuid
+from typing import Dict, Any
+
+from downloads import download_object
+from responses import json_response
+from statements import Statement, run
+from storage import StagedUploadError, get_storage
+
+CHUNK_SIZE = 1024 * 1024
+# Same cap as the upload form in src/components/FileUpload.tsx
+MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(10 * 1024 * 1024)))
+# Uploads not completed within this time are abandoned and their chunks removed
+UPLOAD_MAX_AGE_HOURS = int(os.environ.get('UPLOAD_MAX_AGE_HOURS', '24'))
+UPLOAD_PURGE_BATCH_SIZE = 200
+
+UPLOAD_INSERT = Statement('upload_insert', '''
+    INSERT INTO attachment_uploads (id, file_name, content_type, total_size)
+    VALUES ($1, $2, $3, $4)''')
+
+UPLOAD_STATUS = Statement('upload_status', '''
+    SELECT id, total_size, received_size, completed_at FROM attachment_uploads WHERE id = $1''')
+
+UPLOAD_RESTART = Statement('upload_restart', '''
+    UPDATE attachment_uploads SET received_size = 0 WHERE id = $1 AND completed_at IS NULL''')
+
+# Advances only from the offset the chunk was written at, so of two
+# concurrent chunks for one offset exactly one is counted
+UPLOAD_ADVANCE = Statement('upload_advance', '''
+    UPDATE attachment_uploads SET received_size = received_size + $1
+    WHERE id = $2 AND received_size = $3 AND completed_at IS NULL
+    RETURNING received_size''')
+
+UPLOAD_LOCK = Statement('upload_lock', '''
+    SELECT id, file_name, content_type, total_size, received_size, sha256, completed_at
+    FROM attachment_uploads WHERE id = $1 FOR UPDATE''')
+
+# An attachment never expires, even when the same bytes were exported before
+ATTACHMENT_OBJECT_INSERT = Statement('attachment_object_insert', '''
+    INSERT INTO attachment_objects (sha256, size, content_type)
+    VALUES ($1, $2, $3) ON CONFLICT (sha256) DO UPDATE SET expires_at = NULL''')
+
+UPLOAD_COMPLETE = Statement('upload_complete', '''
+    UPDATE attachment_uploads SET sha256 = $1, completed_at = NOW()
+    WHERE id = $2
+    RETURNING id, file_name, content_type, total_size, sha256, completed_at''')
+
+ABANDONED_UPLOADS = Statement('abandoned_uploads', '''
+    SELECT id FROM attachment_uploads
+    WHERE completed_at IS NULL AND created_at < NOW() - make_interval(hours => $1)
+    ORDER BY created_at
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED''')
+
+UPLOADS_DELETE = Statement('uploads_delete', 'DELETE FROM attachment_uploads WHERE id = ANY($1::text[]::uuid[])')
+
+def decode_chunk(event: Dict[str, Any]) -> bytes:
+    '''Chunks are sent as base64 text; the gateway may wrap the body in base64 once more'''
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('ascii')
+    return base64.b64decode(body, validate=True)
+
+def attachment_reference(upload: Dict[str, Any]) -> Dict[str, Any]:
+    '''Lightweight reference stored in tasks.attachments instead of file contents'''
+    return {
+        'id': str(upload['id']),
+        'sha256': upload['sha256'],
+        'name': upload['file_name'],
+        'size': upload['total_size'],
+        'contentType': upload['content_type'],
+        'uploadedAt': upload['completed_at'].isoformat() if upload['completed_at'] else None
+    }
+
+def create_upload(cur, conn, event: Dict[str, Any]) -> Dict[str, Any]:
+    body_data = json.loads(event.get('body') or '{}')
+    file_name = body_data.get('name')
+    total_size = body_data.get('size')
+    content_type = body_data.get('contentType') or 'application/octet-stream'
+
+    if not file_name or not isinstance(total_size, int) or total_size < 0:
+        return json_response(400, {'error': 'Missing required fields: name, size'})
+
+    if total_size > MAX_UPLOAD_SIZE:
+        return json_response(413, {'error': f'File exceeds {MAX_UPLOAD_SIZE} bytes'})
+
+    upload_id = str(uuid.uuid4())
+    run(cur, UPLOAD_INSERT, (upload_id, file_name[:255], content_type[:255], total_size))
+    conn.commit()
+
+    return json_response(201, {'uploadId': upload_id, 'chunkSize': CHUNK_SIZE, 'receivedSize': 0})
+
+def upload_status(cur, upload_id: str) -> Dict[str, Any]:
+    run(cur, UPLOAD_STATUS, (upload_id,))
+    upload = cur.fetchone()
+    if not upload:
+        return json_response(404, {'error': 'Upload not found'})
+
+    return json_response(200, {
+        'uploadId': str(upload['id']),
+        'totalSize': upload['total_size'],
+        'receivedSize': upload['received_size'],
+        'completed': upload['completed_at'] is not None
+    })
+
+def restart_upload(cur, conn, upload_id: str, error: str) -> Dict[str, Any]:
+    '''Staged data was lost or does not add up: the client starts over from offset 0'''
+    run(cur, UPLOAD_RESTART, (upload_id,))
+    conn.commit()
+    return json_response(409, {'error': error, 'receivedSize': 0})
+
+def append_chunk(cur, conn, event: Dict[str, Any], upload_id: str, offset: int) -> Dict[str, Any]:
+    '''
+    Store one chunk and advance received_size only if the chunk starts exactly
+    where the previous one ended. A client that lost track of its position
+    gets 409 with the current offset and resumes from there.
+    '''
+    try:
+        data = decode_chunk(event)
+    except (binascii.Error, ValueError):
+        return json_response(400, {'error': 'Chunk body must be base64 encoded'})
+
+    if len(data) > CHUNK_SIZE:
+        return json_response(413, {'error': f'Chunk exceeds {CHUNK_SIZE} bytes'})
+
+    run(cur, UPLOAD_STATUS, (upload_id,))
+    upload = cur.fetchone()
+    if not upload:
+        return json_response(404, {'error': 'Upload not found'})
+
+    if upload['completed_at'] or offset != upload['received_size'] or offset + len(data) > upload['total_size']:
+        return json_response(409, {'error': 'Unexpected chunk offset', 'receivedSize': upload['received_size']})
+
+    try:
+        get_storage().write_chunk(upload_id, offset, data)
+    except StagedUploadError:
+        return restart_upload(cur, conn, upload_id, 'Staged chunks were lost, restart the upload')
+
+    run(cur, UPLOAD_ADVANCE, (len(data), upload_id, offset))
+    updated = cur.fetchone()
+    conn.commit()
+
+    if not updated:
+        return json_response(409, {'error': 'Concurrent chunk upload', 'receivedSize': offset})
+    return json_response(200, {'uploadId': upload_id, 'receivedSize': updated['received_size']})
+
+def complete_upload(cur, conn, upload_id: str) -> Dict[str, Any]:
+    run(cur, UPLOAD_LOCK, (upload_id,))
+    upload = cur.fetchone()
+    if not upload:
+        return json_response(404, {'error': 'Upload not found'})
+
+    if upload['completed_at']:
+        conn.commit()
+        return json_response(200, {'attachment': attachment_reference(upload)})
+
+    if upload['received_size'] != upload['total_size']:
+        conn.commit()
+        return json_response(409, {'error': 'Upload is incomplete', 'receivedSize': upload['received_size']})
+
+    try:
+        sha256, size = get_storage().finalize(upload_id, upload['total_size'])
+    except StagedUploadError:
+        return restart_upload(cur, conn, upload_id, 'Stored chunks do not match the upload size, restart the upload')
+
+    run(cur, ATTACHMENT_OBJECT_INSERT, (sha256, size, upload['content_type']))
+    run(cur, UPLOAD_COMPLETE, (sha256, upload_id))
+    completed = cur.fetchone()
+    conn.commit()
+
+    return json_response(200, {'attachment': attachment_reference(completed)})
+
+def purge_abandoned_uploads(conn, max_age_hours: int = UPLOAD_MAX_AGE_HOURS,
+                            batch_size: int = UPLOAD_PURGE_BATCH_SIZE) -> int:
+    '''
+    Remove uploads left incomplete for max_age_hours together with their
+    staged chunks, in batches that commit on their own. Rows are only
+    deleted once their chunks are gone, so a failed run is retried.
+    '''
+    storage = get_storage()
+    cur = conn.cursor()
+    purged = 0
+    while True:
+        run(cur, ABANDONED_UPLOADS, (max_age_hours, batch_size))
+        upload_ids = [str(row['id']) for row in cur.fetchall()]
+        for upload_id in upload_ids:
+            storage.discard(upload_id)
+        if upload_ids:
+            run(cur, UPLOADS_DELETE, (upload_ids,))
+        conn.commit()
+        purged += len(upload_ids)
+        if len(upload_ids) < batch_size:
+            break
+
+    cur.close()
+    return purged
+
+def handle_attachment_request(cur, conn, event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Resumable chunked uploads and downloads of task attachments:
+    POST creates an upload, PUT ?uploadId&offset appends a chunk,
+    GET ?uploadId reports progress, POST ?uploadId&action=complete stores
+    the file under its SHA-256, GET ?sha256 downloads it (Range supported).
+    '''
+    method = event.get('httpMethod', 'GET')
+    query_params = event.get('queryStringParameters') or {}
+    upload_id = query_params.get('uploadId')
+
+    if upload_id:
+        try:
+            upload_id = str(uuid.UUID(upload_id))
+        except ValueError:
+            return json_response(400, {'error': 'Invalid upload ID'})
+
+    if method == 'POST' and not upload_id:
+        return create_upload(cur, conn, event)
+
+    if method == 'POST' and query_params.get('action') == 'complete':
+        return complete_upload(cur, conn, upload_id)
+
+    if method == 'PUT' and upload_id:
+        offset = query_params.get('offset', '')
+        if not offset.isdigit():
+            return json_response(400, {'error': 'Chunk offset is required'})
+        return append_chunk(cur, conn, event, upload_id, int(offset))
+
+    if method == 'GET' and upload_id:
+        return upload_status(cur, upload_id)
+
+    if method == 'GET' and query_params.get('sha256'):
+        return download_object(cur, event, query_params['sha256'], query_params.get('name') or query_params['sha256'])
+
+    return json_response(405, {'error': 'Method not allowed'})
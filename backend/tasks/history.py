@@ -0,0 +1,94 @@
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from statements import Statement, run
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+PARTITION_MONTHS_AHEAD = 3
+
+# Creates the missing monthly partitions of a table, see V0010
+PARTITIONS_ENSURE = Statement('partitions_ensure', 'SELECT ensure_monthly_partitions($1, $2, $3) AS created')
+
+HISTORY_PAGE = Statement('task_history_page', '''
+    SELECT id, changed_at, changed_by, changes FROM task_history
+    WHERE task_id = $1
+    ORDER BY changed_at DESC, id DESC LIMIT $2''')
+
+HISTORY_PAGE_BEFORE = Statement('task_history_page_before', '''
+    SELECT id, changed_at, changed_by, changes FROM task_history
+    WHERE task_id = $1 AND (changed_at, id) < ($2, $3)
+    ORDER BY changed_at DESC, id DESC LIMIT $4''')
+
+def ensure_history_partitions(cur, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    '''Create task_history partitions for the current month and months_ahead future months'''
+    run(cur, PARTITIONS_ENSURE, ('task_history', date.today().replace(day=1), months_ahead + 1))
+    return cur.fetchone()['created']
+
+def build_update_with_history(update_fields: List[str], returning: str) -> str:
+    '''
+    Wrap a task UPDATE into one statement that also appends a history row.
+    The previous row is locked and read from the same snapshot, and the
+    history row stores only the columns whose values actually changed.
+    Parameters: task id, then the SET values, then the changing user id.
+    '''
+    return f'''WITH previous AS (
+            SELECT * FROM tasks WHERE id = %s FOR UPDATE
+        ),
+        updated AS (
+            UPDATE tasks SET {', '.join(update_fields)}
+            WHERE id = (SELECT id FROM previous)
+            RETURNING {returning}
+        ),
+        history AS (
+            INSERT INTO task_history (task_id, changed_by, changes)
+            SELECT updated.id, %s, diff.changes
+            FROM updated, previous, LATERAL (
+                SELECT jsonb_object_agg(
+                    new_row.key, jsonb_build_object('from', old_row.value, 'to', new_row.value)
+                ) AS changes
+                FROM jsonb_each(to_jsonb(previous)) old_row
+                JOIN jsonb_each(to_jsonb(updated)) new_row ON new_row.key = old_row.key
+                WHERE new_row.key <> 'updated_at' AND new_row.value IS DISTINCT FROM old_row.value
+            ) diff
+            WHERE diff.changes IS NOT NULL
+        )
+        SELECT * FROM updated'''
+
+def parse_history_page(query_params: Dict[str, Any]) -> Tuple[Optional[Tuple[datetime, int]], int]:
+    '''
+    Validate the paging parameters of a history request: limit between 1
+    and HISTORY_MAX_PAGE_SIZE, and an optional before/beforeId position
+    taken from a previous page. Raises ValueError on anything else.
+    '''
+    limit = query_params.get('limit', str(HISTORY_PAGE_SIZE))
+    if not limit.isdigit() or not 1 <= int(limit) <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be an integer between 1 and {HISTORY_MAX_PAGE_SIZE}')
+
+    before = query_params.get('before')
+    before_id = query_params.get('beforeId')
+    if not before and not before_id:
+        return None, int(limit)
+    if not before or not before_id or not before_id.isdigit():
+        raise ValueError('before and beforeId must be given together, as returned in nextBefore and nextBeforeId')
+    try:
+        return (datetime.fromisoformat(before), int(before_id)), int(limit)
+    except ValueError:
+        raise ValueError('before must be an ISO 8601 timestamp')
+
+def fetch_task_history(cur, task_id: str, position: Optional[Tuple[datetime, int]], limit: int) -> List[Dict[str, Any]]:
+    '''Newest-first page of history for one task, keyset-paginated on (changed_at, id)'''
+    if position:
+        run(cur, HISTORY_PAGE_BEFORE, (task_id, position[0], position[1], limit))
+    else:
+        run(cur, HISTORY_PAGE, (task_id, limit))
+
+    history_list = []
+    for entry in cur.fetchall():
+        history_list.append({
+            'id': str(entry['id']),
+            'changedAt': entry['changed_at'].isoformat(),
+            'changedBy': str(entry['changed_by']) if entry['changed_by'] else None,
+            'changes': entry['changes']
+        })
+    return history_list
@@ -1,16 +1,137 @@
 import json
+import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
-def get_db_connection():
-    '''Get database connection using DATABASE_URL from environment'''
+from compression import compress_response
+from attachments import handle_attachment_request
+from downloads import handle_download_request, store_export
+from maintenance import archive_with_partitions, is_timer_event, run_maintenance
+from recurrence import handle_template_request
+from export import (
+    CSV_CONTENT_TYPE,
+    XLSX_CONTENT_TYPE,
+    MAX_INLINE_BYTES,
+    select_list,
+    export_query,
+    exported_size,
+    file_response
+)
+from history import (
+    parse_history_page,
+    fetch_task_history
+)
+from queries import (
+    TASK_LIST,
+    TASK_CALENDAR,
+    TASK_CALENDAR_ARCHIVE,
+    TASK_INSERT,
+    TASK_UPDATE,
+    TASK_IN_GROUP,
+    TASK_DELETE,
+    parse_due_range,
+    parse_task_page,
+    month_range,
+    task_list_params,
+    task_update_params
+)
+from statements import ConnectionPool, run
+from ratelimit import RateLimiter, DEFAULT_BUDGETS, rejection_response
+from resilience import CircuitBreaker, CONNECT_TIMEOUT_SECONDS, STATEMENT_TIMEOUTS_MS, metrics_response
+from idempotency import (
+    MAX_KEY_LENGTH,
+    get_idempotency_key,
+    request_fingerprint,
+    acquire_idempotency_key,
+    store_idempotent_response,
+    maybe_purge_expired_keys
+)
+
+rate_limiter = RateLimiter(DEFAULT_BUDGETS)
+db_breaker = CircuitBreaker()
+db_pool = ConnectionPool()
+# The runtime's root logger stops at WARNING; basicConfig only adds a
+# stderr handler where none is installed, e.g. when run locally
+logging.basicConfig()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TASK_EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('title', 'Название'),
+    ('description', 'Описание'),
+    ('status', 'Статус'),
+    ('priority', 'Приоритет'),
+    ('assignee', 'Исполнитель'),
+    ('due_date', 'Срок'),
+    ('created_at', 'Создано'),
+    ('updated_at', 'Обновлено')
+]
+
+def build_task_filters(query_params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    '''
+    WHERE clause fragment and parameters for the export filters; COPY cannot
+    run prepared statements. Raises ValueError on a malformed due date.
+    '''
+    status_filter = query_params.get('status')
+    priority_filter = query_params.get('priority')
+    due_range = parse_due_range(query_params)
+    
+    filters = ''
+    params = []
+    
+    if status_filter and status_filter != 'all':
+        filters += ' AND status = %s'
+        params.append(status_filter)
+    
+    if priority_filter and priority_filter != 'all':
+        filters += ' AND priority = %s'
+        params.append(priority_filter)
+    
+    if due_range:
+        filters += ' AND due_date >= %s AND due_date < %s'
+        params.extend(due_range)
+    
+    return filters, params
+
+def includes_archive(query_params: Dict[str, Any]) -> bool:
+    '''Archived tasks are all completed, so the archive is only read when the status filter allows it'''
+    include_archived = query_params.get('includeArchived') in ('true', '1')
+    return include_archived and query_params.get('status') in (None, 'all', 'completed')
+
+def build_task_export_query(query_params: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    '''Export query and parameters for the request's filters. Raises ValueError on a malformed due date.'''
+    filters, params = build_task_filters(query_params)
+    columns = select_list(TASK_EXPORT_COLUMNS)
+    query = f'SELECT {columns} FROM tasks WHERE 1=1{filters}'
+    
+    if includes_archive(query_params):
+        query += f' UNION ALL SELECT {columns} FROM tasks_archive WHERE 1=1{filters}'
+        params = params * 2
+    
+    return query + ' ORDER BY "Срок" ASC', params
+
+def get_db_connection(route: str = 'read'):
+    '''Get a pooled database connection using DATABASE_URL from environment, with the route's statement timeout'''
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         raise ValueError('DATABASE_URL environment variable is not set')
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    return db_pool.acquire(
+        database_url,
+        STATEMENT_TIMEOUTS_MS[route],
+        cursor_factory=RealDictCursor,
+        connect_timeout=CONNECT_TIMEOUT_SECONDS
+    )
+
+def classify_route(event: Dict[str, Any]) -> str:
+    '''Map a request onto its rate limit budget: reads are cheap, writes and exports are not'''
+    resource = (event.get('queryStringParameters') or {}).get('resource', 'tasks')
+    if resource == 'export':
+        return 'heavy'
+    return 'read' if event.get('httpMethod', 'GET') == 'GET' else 'write'
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -19,6 +140,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
           context - object with request_id, function_name attributes
     Returns: HTTP response dict with task data or error
     '''
+    if event.get('httpMethod') == 'OPTIONS':
+        return route_request(event, context)
+    
+    if is_timer_event(event):
+        return run_scheduled_maintenance()
+    
+    if (event.get('queryStringParameters') or {}).get('resource') == 'metrics':
+        return metrics_response(db_breaker, rate_limiter, db_pool)
+    
+    route = classify_route(event)
+    rejection = rate_limiter.admit(event, route)
+    if rejection:
+        return rejection
+    
+    try:
+        if not db_breaker.allow():
+            return rejection_response(503, 'Database is temporarily unavailable', db_breaker.retry_after())
+        
+        try:
+            response = route_request(event, context)
+        except psycopg2.OperationalError:
+            db_breaker.record_failure()
+            return rejection_response(503, 'Database is unavailable, please retry later', db_breaker.retry_after())
+        
+        db_breaker.record_success()
+    finally:
+        rate_limiter.release(route)
+    
+    return compress_response(event, response)
+
+def run_scheduled_maintenance() -> Dict[str, Any]:
+    '''Timer trigger: archive, create partitions ahead and generate recurring tasks'''
+    conn = get_db_connection('heavy')
+    try:
+        result = run_maintenance(conn)
+    finally:
+        conn.close()
+    
+    logger.info('Scheduled maintenance: %s', json.dumps(result))
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(result),
+        'isBase64Encoded': False
+    }
+
+def route_request(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''Dispatch the request by HTTP method and build an uncompressed response'''
     method: str = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -27,39 +196,263 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Role, X-User-Group-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Role, X-User-Group-Id, X-User-Id, X-Session-Token, Idempotency-Key, Range',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
-        conn = get_db_connection()
+        route = classify_route(event)
+        conn = get_db_connection(route)
+        rate_limited = rate_limiter.check_shared(conn, event, route)
+        if rate_limited:
+            conn.close()
+            return rate_limited
+        
         cur = conn.cursor()
         
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            status_filter = query_params.get('status')
-            priority_filter = query_params.get('priority')
+        query_params = event.get('queryStringParameters') or {}
+        resource = query_params.get('resource', 'tasks')
+        
+        if resource == 'archive':
+            if method != 'POST':
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Method not allowed'}),
+                    'isBase64Encoded': False
+                }
+            
+            headers = event.get('headers') or {}
+            user_role = headers.get('X-User-Role') or headers.get('x-user-role')
+            
+            if user_role != 'department_head':
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Access denied: only department head can archive tasks'}),
+                    'isBase64Encoded': False
+                }
             
-            query = 'SELECT id, title, description, status, priority, assignee, due_date, created_at, updated_at, attachments FROM tasks WHERE 1=1'
-            params = []
+            cur.close()
+            result = archive_with_partitions(conn)
+            conn.close()
             
-            if status_filter and status_filter != 'all':
-                query += ' AND status = %s'
-                params.append(status_filter)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result),
+                'isBase64Encoded': False
+            }
+        
+        if resource == 'attachments':
+            response = handle_attachment_request(cur, conn, event)
+            cur.close()
+            conn.close()
+            return response
+        
+        if resource == 'downloads':
+            response = handle_download_request(cur, event)
+            cur.close()
+            conn.close()
+            return response
+        
+        if resource == 'templates':
+            response = handle_template_request(cur, conn, event)
+            cur.close()
+            conn.close()
+            return response
+        
+        if resource == 'history':
+            task_id = query_params.get('taskId')
             
-            if priority_filter and priority_filter != 'all':
-                query += ' AND priority = %s'
-                params.append(priority_filter)
+            if method != 'GET' or not task_id or not task_id.isdigit():
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400 if method == 'GET' else 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Task ID is required' if method == 'GET' else 'Method not allowed'}),
+                    'isBase64Encoded': False
+                }
+            
+            try:
+                position, limit = parse_history_page(query_params)
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
             
-            query += ' ORDER BY due_date ASC'
+            history_list = fetch_task_history(cur, task_id, position, limit)
+            has_more = len(history_list) == limit
             
-            if params:
-                cur.execute(query, params)
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'history': history_list,
+                    'nextBefore': history_list[-1]['changedAt'] if has_more else None,
+                    'nextBeforeId': history_list[-1]['id'] if has_more else None
+                }),
+                'isBase64Encoded': False
+            }
+        
+        if resource == 'export':
+            export_format = query_params.get('format', 'csv')
+            
+            if method != 'GET' or export_format not in ('csv', 'xlsx'):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400 if method == 'GET' else 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'Unsupported export format' if method == 'GET' else 'Method not allowed'}),
+                    'isBase64Encoded': False
+                }
+            
+            try:
+                query, params = build_task_export_query(query_params)
+            except ValueError:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'dueFrom and dueTo must be dates in YYYY-MM-DD format'}),
+                    'isBase64Encoded': False
+                }
+            
+            content_type = XLSX_CONTENT_TYPE if export_format == 'xlsx' else CSV_CONTENT_TYPE
+            file_name = f"tasks-{datetime.now().strftime('%Y-%m-%d')}.{export_format}"
+            exported = export_query(conn, query, params, [label for _, label in TASK_EXPORT_COLUMNS], export_format, 'Поручения')
+            
+            if exported_size(exported) > MAX_INLINE_BYTES:
+                response = store_export(cur, conn, exported, file_name, content_type)
             else:
-                cur.execute(query)
+                response = file_response(exported, file_name, content_type)
+            
+            cur.close()
+            conn.close()
+            return response
+        
+        if resource == 'calendar':
+            try:
+                month_start, month_end = month_range(query_params.get('month') or datetime.now().strftime('%Y-%m'))
+            except ValueError:
+                month_start = None
+            
+            if method != 'GET' or not month_start:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400 if method == 'GET' else 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'month must be in YYYY-MM format' if method == 'GET' else 'Method not allowed'}),
+                    'isBase64Encoded': False
+                }
+            
+            statement = TASK_CALENDAR_ARCHIVE if includes_archive(query_params) else TASK_CALENDAR
+            run(cur, statement, (month_start, month_end))
+            
+            days = {}
+            for row in cur.fetchall():
+                day = days.setdefault(row['day'], {'date': row['day'].isoformat(), 'total': 0, 'counts': {}})
+                day['counts'][row['status']] = row['task_count']
+                day['total'] += row['task_count']
+            
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'month': month_start.strftime('%Y-%m'), 'days': list(days.values())}),
+                'isBase64Encoded': False
+            }
+        
+        if method == 'GET':
+            try:
+                due_range = parse_due_range(query_params)
+            except ValueError:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'dueFrom and dueTo must be dates in YYYY-MM-DD format'}),
+                    'isBase64Encoded': False
+                }
+            
+            try:
+                position, limit = parse_task_page(query_params)
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)}),
+                    'isBase64Encoded': False
+                }
+            
+            statement = TASK_LIST[(
+                query_params.get('status') not in (None, '', 'all'),
+                query_params.get('priority') not in (None, '', 'all'),
+                due_range is not None,
+                includes_archive(query_params)
+            )]
+            run(cur, statement, task_list_params(query_params, due_range, position, limit))
             
             tasks = cur.fetchall()
             
@@ -78,6 +471,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'attachments': task['attachments'] if task['attachments'] else []
                 })
             
+            # Unpaged requests get the plain list they always got
+            body = {'tasks': tasks_list}
+            if limit is not None:
+                has_more = len(tasks_list) == limit
+                body['nextAfter'] = tasks_list[-1]['dueDate'] if has_more else None
+                body['nextAfterId'] = tasks_list[-1]['id'] if has_more else None
+            
             cur.close()
             conn.close()
             
@@ -87,7 +487,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps({'tasks': tasks_list}),
+                'body': json.dumps(body),
                 'isBase64Encoded': False
             }
         
@@ -113,14 +513,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(
-                '''INSERT INTO tasks (title, description, status, priority, assignee, due_date, attachments) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id, title, description, status, priority, assignee, due_date, created_at, updated_at, attachments''',
-                (title, description, status, priority, assignee, due_date, json.dumps(attachments))
-            )
+            idempotency_key = get_idempotency_key(event)
+            if idempotency_key:
+                if len(idempotency_key) > MAX_KEY_LENGTH:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Idempotency-Key is too long'}),
+                        'isBase64Encoded': False
+                    }
+                
+                request_hash = request_fingerprint(event)
+                stored_response = acquire_idempotency_key(cur, 'tasks', idempotency_key, request_hash)
+                if stored_response:
+                    conn.commit()
+                    cur.close()
+                    conn.close()
+                    return stored_response
+            
+            run(cur, TASK_INSERT, (title, description, status, priority, assignee, due_date, json.dumps(attachments)))
             
             new_task = cur.fetchone()
-            conn.commit()
             
             task_data = {
                 'id': str(new_task['id']),
@@ -135,10 +553,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'attachments': new_task['attachments'] if new_task['attachments'] else []
             }
             
-            cur.close()
-            conn.close()
-            
-            return {
+            response = {
                 'statusCode': 201,
                 'headers': {
                     'Content-Type': 'application/json',
@@ -147,6 +562,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'task': task_data}),
                 'isBase64Encoded': False
             }
+            
+            if idempotency_key:
+                store_idempotent_response(cur, 'tasks', idempotency_key, request_hash, response)
+            
+            conn.commit()
+            maybe_purge_expired_keys(conn)
+            
+            cur.close()
+            conn.close()
+            
+            return response
         
         elif method == 'PUT':
             path_params = event.get('pathParams') or {}
@@ -168,12 +594,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user_group_id = headers.get('X-User-Group-Id') or headers.get('x-user-group-id')
             
             if user_role == 'group_head' and user_group_id:
-                cur.execute(
-                    '''SELECT t.id FROM tasks t
-                       JOIN employees e ON t.assignee = e.full_name
-                       WHERE t.id = %s AND e.group_id = %s''',
-                    (task_id, user_group_id)
-                )
+                run(cur, TASK_IN_GROUP, (task_id, user_group_id))
                 task_check = cur.fetchone()
                 if not task_check:
                     cur.close()
@@ -202,37 +623,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             body_data = json.loads(event.get('body', '{}'))
             
-            update_fields = []
-            params = []
-            
-            if 'title' in body_data:
-                update_fields.append('title = %s')
-                params.append(body_data['title'])
-            if 'description' in body_data:
-                update_fields.append('description = %s')
-                params.append(body_data['description'])
-            if 'status' in body_data:
-                update_fields.append('status = %s')
-                params.append(body_data['status'])
-            if 'priority' in body_data:
-                update_fields.append('priority = %s')
-                params.append(body_data['priority'])
-            if 'assignee' in body_data:
-                update_fields.append('assignee = %s')
-                params.append(body_data['assignee'])
-            if 'dueDate' in body_data:
-                update_fields.append('due_date = %s')
-                params.append(body_data['dueDate'])
-            if 'attachments' in body_data:
-                update_fields.append('attachments = %s')
-                params.append(json.dumps(body_data['attachments']))
-            
-            update_fields.append('updated_at = NOW()')
-            params.append(task_id)
-            
-            query = f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = %s RETURNING id, title, description, status, priority, assignee, due_date, created_at, updated_at, attachments"
-            
-            cur.execute(query, params)
+            user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+            params = [task_id] + task_update_params(body_data) + [user_id if user_id and user_id.isdigit() else None]
+            
+            run(cur, TASK_UPDATE, params)
             updated_task = cur.fetchone()
             
             if not updated_task:
@@ -296,12 +690,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             user_group_id = headers.get('X-User-Group-Id') or headers.get('x-user-group-id')
             
             if user_role == 'group_head' and user_group_id:
-                cur.execute(
-                    '''SELECT t.id FROM tasks t
-                       JOIN employees e ON t.assignee = e.full_name
-                       WHERE t.id = %s AND e.group_id = %s''',
-                    (task_id, user_group_id)
-                )
+                run(cur, TASK_IN_GROUP, (task_id, user_group_id))
                 task_check = cur.fetchone()
                 if not task_check:
                     cur.close()
@@ -328,7 +717,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute('DELETE FROM tasks WHERE id = %s RETURNING id', (task_id,))
+            run(cur, TASK_DELETE, (task_id,))
             deleted_task = cur.fetchone()
             
             if not deleted_task:
@@ -371,13 +760,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
     
-    except Exception as e:
+    except psycopg2.OperationalError:
+        raise
+    
+    except Exception:
+        # Details go to the log only; the message may quote SQL or data
+        request_id = getattr(context, 'request_id', None)
+        logger.exception('Unhandled error in %s %s (request %s)', method, event.get('queryStringParameters'), request_id)
         return {
             'statusCode': 500,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'error': f'Internal server error: {str(e)}'}),
+            'body': json.dumps({'error': 'Internal server error', 'requestId': request_id}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    
+    finally:
+        # Branches that return early release the connection here; a second close is a no-op
+        if conn is not None:
+            conn.close()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import json
+from typing import Dict, Any
+
+from archive import archive_completed_tasks
+from attachments import purge_abandoned_uploads
+from downloads import purge_expired_exports
+from history import ensure_history_partitions
+from recurrence import generate_recurring_tasks
+
+TIMER_EVENT_TYPE = 'yandex.cloud.events.serverless.triggers.TimerMessage'
+
+def is_timer_event(event: Dict[str, Any]) -> bool:
+    '''Invocation by a timer trigger rather than a request through the API gateway'''
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        (message.get('event_metadata') or {}).get('event_type') == TIMER_EVENT_TYPE for message in messages
+    )
+
+def archive_with_partitions(conn) -> Dict[str, Any]:
+    '''Create the coming task_history partitions, then move old completed tasks into the archive'''
+    cur = conn.cursor()
+    history_partitions = ensure_history_partitions(cur)
+    conn.commit()
+    cur.close()
+
+    result = archive_completed_tasks(conn)
+    result['historyPartitionsCreated'] = history_partitions
+    return result
+
+def run_maintenance(conn) -> Dict[str, Any]:
+    '''
+    Periodic upkeep of the tasks database: partitions for the coming
+    months, archiving, the tasks of recurring templates up to their
+    horizon, the chunks of abandoned uploads and expired exports of both
+    functions. Every step commits in batches and is safe to rerun, so a
+    daily timer trigger or cron job can call it without coordination.
+    '''
+    result = archive_with_partitions(conn)
+    result['recurring'] = generate_recurring_tasks(conn)
+    result['abandonedUploadsPurged'] = purge_abandoned_uploads(conn)
+    result['exportsPurged'] = purge_expired_exports(conn)
+    return result
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('Set DATABASE_URL to run maintenance')
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    print(json.dumps(run_maintenance(conn)))
+    conn.close()
@@ -0,0 +1,168 @@
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from history import build_update_with_history
+from statements import Statement, number_placeholders
+
+TASK_COLUMNS = 'id, title, description, status, priority, assignee, due_date, created_at, updated_at, attachments'
+
+TASK_UPDATABLE_FIELDS = [
+    ('title', 'title'),
+    ('description', 'description'),
+    ('status', 'status'),
+    ('priority', 'priority'),
+    ('assignee', 'assignee'),
+    ('dueDate', 'due_date'),
+    ('attachments', 'attachments')
+]
+
+TASK_MAX_PAGE_SIZE = 1000
+
+# Position before the first task of any list; due_date is never this early
+FIRST_PAGE_POSITION = (datetime.min, 0)
+
+def task_list_statement(by_status: bool, by_priority: bool, by_due: bool, with_archive: bool) -> Statement:
+    '''
+    One of the sixteen task list shapes: each optional filter is either
+    present or absent. The due date range always has both bounds, an open
+    end is passed as a far date, so it adds one shape rather than three.
+    Every shape reads after a (due_date, id) position up to a limit, so a
+    paged list is walked through an index instead of being sorted whole;
+    a NULL limit reads to the end.
+    '''
+    conditions = []
+    if by_status:
+        conditions.append('status = $1')
+    if by_priority:
+        conditions.append(f'priority = ${len(conditions) + 1}')
+    if by_due:
+        conditions.append(f'due_date >= ${len(conditions) + 1} AND due_date < ${len(conditions) + 2}')
+    param_count = len(conditions) + (1 if by_due else 0)
+    conditions.append(f'(due_date, id) > (${param_count + 1}, ${param_count + 2})')
+    where = ' WHERE ' + ' AND '.join(conditions)
+
+    page = f' ORDER BY due_date ASC, id ASC LIMIT ${param_count + 3}'
+    sql = f'SELECT {TASK_COLUMNS} FROM tasks{where}{page}'
+    if with_archive:
+        # Each side is cut to a page on its own index before the merge, the
+        # planner does not push the limit through UNION ALL by itself
+        sql = f'SELECT * FROM (({sql}) UNION ALL (SELECT {TASK_COLUMNS} FROM tasks_archive{where}{page})) page{page}'
+
+    name = ('task_list' + ('_status' if by_status else '') + ('_priority' if by_priority else '')
+            + ('_due' if by_due else '') + ('_archive' if with_archive else ''))
+    return Statement(name, sql)
+
+TASK_LIST = {
+    (by_status, by_priority, by_due, with_archive): task_list_statement(by_status, by_priority, by_due, with_archive)
+    for by_status in (False, True)
+    for by_priority in (False, True)
+    for by_due in (False, True)
+    for with_archive in (False, True)
+}
+
+# Tasks per day and status of one month, for the calendar view
+TASK_CALENDAR = Statement('task_calendar', '''
+    SELECT due_date::date AS day, status, COUNT(*) AS task_count
+    FROM tasks
+    WHERE due_date >= $1 AND due_date < $2
+    GROUP BY 1, 2
+    ORDER BY 1, 2''')
+
+TASK_CALENDAR_ARCHIVE = Statement('task_calendar_archive', '''
+    SELECT due_date::date AS day, status, COUNT(*) AS task_count
+    FROM (
+        SELECT due_date, status FROM tasks WHERE due_date >= $1 AND due_date < $2
+        UNION ALL
+        SELECT due_date, status FROM tasks_archive WHERE due_date >= $1 AND due_date < $2
+    ) t
+    GROUP BY 1, 2
+    ORDER BY 1, 2''')
+
+TASK_INSERT = Statement('task_insert', f'''
+    INSERT INTO tasks (title, description, status, priority, assignee, due_date, attachments)
+    VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING {TASK_COLUMNS}''')
+
+# Every PUT runs the same statement: each column gets a "was it sent" flag
+# and a value, and keeps its current value when the flag is false.
+TASK_UPDATE = Statement('task_update', number_placeholders(build_update_with_history(
+    [f'{column} = CASE WHEN %s THEN %s ELSE {column} END' for _, column in TASK_UPDATABLE_FIELDS] + ['updated_at = NOW()'],
+    TASK_COLUMNS
+)))
+
+TASK_IN_GROUP = Statement('task_in_group', '''
+    SELECT t.id FROM tasks t
+    JOIN employees e ON t.assignee = e.full_name
+    WHERE t.id = $1 AND e.group_id = $2''')
+
+TASK_DELETE = Statement('task_delete', 'DELETE FROM tasks WHERE id = $1 RETURNING id')
+
+def parse_due_range(query_params: Dict[str, Any]) -> Optional[Tuple[date, date]]:
+    '''
+    dueFrom and dueTo are inclusive YYYY-MM-DD dates, either may be left
+    out; returns the half-open range [from, day after to), None with
+    neither. Raises ValueError on a malformed date, and on dueTo=9999-12-31
+    whose day after Python cannot represent.
+    '''
+    due_from = query_params.get('dueFrom')
+    due_to = query_params.get('dueTo')
+    if not due_from and not due_to:
+        return None
+    start = date.fromisoformat(due_from) if due_from else date.min
+    try:
+        end = date.fromisoformat(due_to) + timedelta(days=1) if due_to else date.max
+    except OverflowError:
+        raise ValueError('dueTo must be before 9999-12-31')
+    return start, end
+
+def month_range(month: str) -> Tuple[date, date]:
+    '''First day of a YYYY-MM month and of the month after it; raises ValueError, also for 9999-12'''
+    start = date.fromisoformat(month + '-01')
+    try:
+        return start, (start + timedelta(days=32)).replace(day=1)
+    except OverflowError:
+        raise ValueError('month must be before 9999-12')
+
+def parse_task_page(query_params: Dict[str, Any]) -> Tuple[Tuple[datetime, int], Optional[int]]:
+    '''
+    Validate the optional paging parameters of a task list: limit between
+    1 and TASK_MAX_PAGE_SIZE, and an after/afterId position taken from the
+    previous page. Without a limit the whole list is returned, as before
+    paging existed. Raises ValueError on anything else.
+    '''
+    limit = query_params.get('limit')
+    if limit is not None and (not limit.isdigit() or not 1 <= int(limit) <= TASK_MAX_PAGE_SIZE):
+        raise ValueError(f'limit must be an integer between 1 and {TASK_MAX_PAGE_SIZE}')
+    limit = int(limit) if limit is not None else None
+
+    after = query_params.get('after')
+    after_id = query_params.get('afterId')
+    if not after and not after_id:
+        return FIRST_PAGE_POSITION, limit
+    if not after or not after_id or not after_id.lstrip('-').isdigit():
+        raise ValueError('after and afterId must be given together, as returned in nextAfter and nextAfterId')
+    try:
+        return (datetime.fromisoformat(after), int(after_id)), limit
+    except ValueError:
+        raise ValueError('after must be an ISO 8601 timestamp')
+
+def task_list_params(query_params: Dict[str, Any], due_range: Optional[Tuple[date, date]] = None,
+                     position: Tuple[datetime, int] = FIRST_PAGE_POSITION, limit: Optional[int] = None) -> List[Any]:
+    params = [
+        value for value in (query_params.get('status'), query_params.get('priority'))
+        if value and value != 'all'
+    ]
+    if due_range:
+        params.extend(due_range)
+    params.extend([position[0], position[1], limit])
+    return params
+
+def task_update_params(body_data: Dict[str, Any]) -> List[Any]:
+    '''Flag/value pairs for TASK_UPDATE in TASK_UPDATABLE_FIELDS order'''
+    params = []
+    for key, _ in TASK_UPDATABLE_FIELDS:
+        value = body_data.get(key)
+        if key == 'attachments' and key in body_data:
+            value = json.dumps(value)
+        params.extend([key in body_data, value])
+    return params
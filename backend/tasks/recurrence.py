@@ -0,0 +1,215 @@
+import json
+from datetime import date, time
+from typing import Dict, Any
+
+from responses import json_response
+from statements import Statement, run
+
+TEMPLATE_BATCH_SIZE = 500
+TEMPLATE_MAX_BATCHES = 20
+# Longest stretch of a schedule expanded per template and batch; keeps a
+# batch of daily templates that are far behind within the statement timeout
+TEMPLATE_WINDOW_DAYS = 92
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+PRIORITIES = ('high', 'medium', 'low')
+
+TEMPLATE_COLUMNS = ('id, title, description, priority, assignee, frequency, interval_count, starts_on, '
+                    'until_date, due_time, lead_days, generated_until, is_active, created_at')
+
+def steps_since_start(day: str) -> str:
+    '''
+    Whole schedule steps from starts_on to the given date. Months and years
+    are counted on the calendar, so the result may be one step ahead of
+    the last occurrence before that date; callers filter by date anyway.
+    '''
+    return f'''(CASE t.frequency
+        WHEN 'DAILY' THEN ({day} - t.starts_on) / t.interval_count
+        WHEN 'WEEKLY' THEN ({day} - t.starts_on) / (7 * t.interval_count)
+        WHEN 'MONTHLY' THEN ((EXTRACT(YEAR FROM {day}) - EXTRACT(YEAR FROM t.starts_on)) * 12
+                             + EXTRACT(MONTH FROM {day}) - EXTRACT(MONTH FROM t.starts_on))::int / t.interval_count
+        ELSE (EXTRACT(YEAR FROM {day}) - EXTRACT(YEAR FROM t.starts_on))::int / t.interval_count
+    END)'''
+
+# One batch of templates in one statement: lock the templates furthest
+# behind their horizon (idx_task_templates_next_due), expand every
+# occurrence in the window between the watermark and the horizon (at most
+# $2 days of it), insert them all and move the watermark.
+# Occurrence k is starts_on + k steps rather than the previous occurrence
+# plus one step, so the 31st stays the 31st after a short month.
+TEMPLATE_GENERATE = Statement('template_generate', f'''
+    WITH batch AS (
+        SELECT id, title, description, priority, assignee, frequency, interval_count, starts_on, due_time,
+               GREATEST(starts_on, created_at::date, generated_until + 1) AS window_start,
+               LEAST(until_date, CURRENT_DATE + lead_days,
+                     GREATEST(starts_on, created_at::date, generated_until + 1) + $2::int - 1) AS window_end,
+               CASE frequency
+                   WHEN 'DAILY' THEN make_interval(days => interval_count)
+                   WHEN 'WEEKLY' THEN make_interval(weeks => interval_count)
+                   WHEN 'MONTHLY' THEN make_interval(months => interval_count)
+                   ELSE make_interval(years => interval_count)
+               END AS step
+        FROM task_templates
+        WHERE is_active
+          AND (until_date IS NULL OR generated_until IS NULL OR generated_until < until_date)
+          AND COALESCE(generated_until, starts_on - 1) - lead_days < CURRENT_DATE
+        ORDER BY COALESCE(generated_until, starts_on - 1) - lead_days
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    ),
+    occurrences AS (
+        SELECT t.id, t.title, t.description, t.priority, t.assignee, t.due_time, t.window_start, t.window_end,
+               (t.starts_on + k * t.step)::date AS occurrence_date
+        FROM batch t
+        CROSS JOIN LATERAL generate_series(GREATEST({steps_since_start('t.window_start')} - 1, 0),
+                                           {steps_since_start('t.window_end')}) k
+    ),
+    created AS (
+        INSERT INTO tasks (title, description, status, priority, assignee, due_date, template_id, occurrence_date)
+        SELECT title, description, 'pending', priority, assignee, occurrence_date + due_time, id, occurrence_date
+        FROM occurrences
+        WHERE occurrence_date BETWEEN window_start AND window_end
+        ON CONFLICT (template_id, occurrence_date) DO NOTHING
+        RETURNING id
+    ),
+    advanced AS (
+        UPDATE task_templates tt SET generated_until = t.window_end
+        FROM batch t
+        WHERE tt.id = t.id AND tt.id = ANY(ARRAY(SELECT id FROM batch))
+        RETURNING tt.id
+    )
+    SELECT (SELECT COUNT(*) FROM advanced) AS templates, (SELECT COUNT(*) FROM created) AS created''')
+
+TEMPLATE_LIST = Statement('template_list', f'SELECT {TEMPLATE_COLUMNS} FROM task_templates ORDER BY id')
+
+TEMPLATE_INSERT = Statement('template_insert', f'''
+    INSERT INTO task_templates (title, description, priority, assignee, frequency, interval_count,
+                                starts_on, until_date, due_time, lead_days)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10) RETURNING {TEMPLATE_COLUMNS}''')
+
+def generate_recurring_tasks(conn, batch_size: int = TEMPLATE_BATCH_SIZE,
+                             max_batches: int = TEMPLATE_MAX_BATCHES,
+                             window_days: int = TEMPLATE_WINDOW_DAYS) -> Dict[str, Any]:
+    '''
+    Create the tasks of every active template up to its horizon. Each batch
+    commits on its own and skips templates locked by a concurrent run; the
+    unique (template_id, occurrence_date) key makes reruns harmless. A
+    template far behind catches up over several batches or runs.
+    '''
+    cur = conn.cursor()
+    templates = 0
+    created = 0
+    for _ in range(max_batches):
+        run(cur, TEMPLATE_GENERATE, (batch_size, window_days))
+        result = cur.fetchone()
+        conn.commit()
+        templates += result['templates']
+        created += result['created']
+        if result['templates'] < batch_size:
+            break
+
+    cur.close()
+    return {'templates': templates, 'created': created}
+
+def template_to_dict(template: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': str(template['id']),
+        'title': template['title'],
+        'description': template['description'],
+        'priority': template['priority'],
+        'assignee': template['assignee'],
+        'frequency': template['frequency'],
+        'interval': template['interval_count'],
+        'startsOn': template['starts_on'].isoformat(),
+        'until': template['until_date'].isoformat() if template['until_date'] else None,
+        'dueTime': template['due_time'].isoformat(),
+        'leadDays': template['lead_days'],
+        'generatedUntil': template['generated_until'].isoformat() if template['generated_until'] else None,
+        'isActive': template['is_active'],
+        'createdAt': template['created_at'].isoformat()
+    }
+
+def create_template(cur, conn, event: Dict[str, Any]) -> Dict[str, Any]:
+    body_data = json.loads(event.get('body') or '{}')
+
+    title = body_data.get('title')
+    assignee = body_data.get('assignee')
+    frequency = str(body_data.get('frequency', '')).upper()
+    starts_on = body_data.get('startsOn')
+    priority = body_data.get('priority', 'medium')
+    interval = body_data.get('interval', 1)
+    lead_days = body_data.get('leadDays', 7)
+
+    if not title or not assignee or not starts_on:
+        return json_response(400, {'error': 'Missing required fields: title, assignee, startsOn'})
+    if frequency not in FREQUENCIES:
+        return json_response(400, {'error': f"frequency must be one of {', '.join(FREQUENCIES)}"})
+    if priority not in PRIORITIES:
+        return json_response(400, {'error': f"priority must be one of {', '.join(PRIORITIES)}"})
+    if not isinstance(interval, int) or interval < 1:
+        return json_response(400, {'error': 'interval must be a positive integer'})
+    if not isinstance(lead_days, int) or not 0 <= lead_days <= 366:
+        return json_response(400, {'error': 'leadDays must be between 0 and 366'})
+
+    until = body_data.get('until')
+    try:
+        starts_on = date.fromisoformat(starts_on)
+        until = date.fromisoformat(until) if until else None
+    except (TypeError, ValueError):
+        return json_response(400, {'error': 'startsOn and until must be dates in YYYY-MM-DD format'})
+    if until is not None and until < starts_on:
+        return json_response(400, {'error': 'until must not be before startsOn'})
+    try:
+        due_time = time.fromisoformat(body_data.get('dueTime', '23:59:59'))
+    except (TypeError, ValueError):
+        return json_response(400, {'error': 'dueTime must be a time in HH:MM[:SS] format'})
+
+    run(cur, TEMPLATE_INSERT, (
+        title, body_data.get('description', ''), priority, assignee, frequency, interval,
+        starts_on, until, due_time, lead_days
+    ))
+    template = cur.fetchone()
+    conn.commit()
+    return json_response(201, {'template': template_to_dict(template)})
+
+def handle_template_request(cur, conn, event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Recurring task templates: GET lists them, POST creates one, and
+    POST ?action=generate creates the due tasks of all templates (meant
+    for a scheduled trigger; department head only).
+    '''
+    method = event.get('httpMethod', 'GET')
+    query_params = event.get('queryStringParameters') or {}
+    headers = event.get('headers') or {}
+    user_role = headers.get('X-User-Role') or headers.get('x-user-role')
+
+    if method == 'GET':
+        run(cur, TEMPLATE_LIST)
+        return json_response(200, {'templates': [template_to_dict(template) for template in cur.fetchall()]})
+
+    if method == 'POST' and query_params.get('action') == 'generate':
+        if user_role != 'department_head':
+            return json_response(403, {'error': 'Access denied: only department head can generate recurring tasks'})
+        return json_response(200, generate_recurring_tasks(conn))
+
+    if method == 'POST':
+        if user_role == 'employee':
+            return json_response(403, {'error': 'Access denied: employees cannot create task templates'})
+        return create_template(cur, conn, event)
+
+    return json_response(405, {'error': 'Method not allowed'})
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('Set DATABASE_URL to generate recurring tasks')
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    print(json.dumps(generate_recurring_tasks(conn)))
+    conn.close()
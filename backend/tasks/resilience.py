@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Any
+
+CONNECT_TIMEOUT_SECONDS = int(os.environ.get('DB_CONNECT_TIMEOUT', '3'))
+
+STATEMENT_TIMEOUTS_MS = {
+    'read': 3000,
+    'write': 5000,
+    'heavy': 15000,
+    'auth': 3000
+}
+
+class CircuitBreaker:
+    '''
+    Stops sending requests to a failing database. After failure_threshold
+    consecutive failures the breaker opens and requests fail fast; once
+    reset_timeout has passed a single probe request is let through
+    (half-open) and its outcome closes or re-opens the breaker.
+    '''
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.total_failures = 0
+        self.total_rejections = 0
+        self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        '''Whether a request may try the database now'''
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.probe_in_flight = False
+            if self.state == 'half_open' and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            self.total_rejections += 1
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.consecutive_failures += 1
+            self.total_failures += 1
+            self.probe_in_flight = False
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        '''Seconds until the next probe will be allowed'''
+        with self.lock:
+            if self.state != 'open':
+                return 1
+            return max(1, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutiveFailures': self.consecutive_failures,
+                'totalFailures': self.total_failures,
+                'totalRejections': self.total_rejections,
+                'timesOpened': self.times_opened
+            }
+
+def metrics_response(breaker: CircuitBreaker, limiter, pool) -> Dict[str, Any]:
+    '''In-process metrics of this function instance; answered without touching the database'''
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-store'
+        },
+        'body': json.dumps({
+            'circuitBreaker': breaker.snapshot(),
+            'rateLimiter': limiter.snapshot(),
+            'connectionPool': pool.snapshot(),
+            'statementTimeoutsMs': STATEMENT_TIMEOUTS_MS,
+            'connectTimeoutSeconds': CONNECT_TIMEOUT_SECONDS
+        }),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,37 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from typing import Dict, Any, Optional
+
+# Shared by both functions; without it tokens are opaque and unverifiable
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_HOURS', '12')) * 3600
+
+def _signature(payload: str) -> str:
+    digest = hmac.new(SESSION_SECRET.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+def issue_session_token(user_id: int) -> str:
+    '''<user id>.<expiry>.<HMAC-SHA256 of both>, or a random token when SESSION_SECRET is not set'''
+    if not SESSION_SECRET:
+        return secrets.token_urlsafe(32)
+    payload = f'{user_id}.{int(time.time()) + SESSION_TTL_SECONDS}'
+    return f'{payload}.{_signature(payload)}'
+
+def session_user_id(event: Dict[str, Any]) -> Optional[str]:
+    '''User id of a valid, unexpired X-Session-Token, None for anything else'''
+    if not SESSION_SECRET:
+        return None
+    headers = event.get('headers') or {}
+    token = headers.get('X-Session-Token') or headers.get('x-session-token') or ''
+    parts = token.split('.')
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+        return None
+    if not hmac.compare_digest(_signature(f'{parts[0]}.{parts[1]}'), parts[2]):
+        return None
+    if int(parts[1]) < time.time():
+        return None
+    return parts[0]
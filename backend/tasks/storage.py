@@ -0,0 +1,221 @@
+import hashlib
+import os
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+STREAM_BLOCK_SIZE = 64 * 1024
+S3_PART_SIZE = 5 * 1024 * 1024
+
+class StagedUploadError(Exception):
+    '''Staged chunks are missing or do not add up to the size the upload declared'''
+
+class LocalStorage:
+    '''
+    Content-addressed file storage on a local or mounted filesystem.
+    Uploads are staged under uploads/<upload_id> and moved to
+    objects/<sha[:2]>/<sha> once complete; identical files share one object.
+    '''
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(os.path.join(root, 'uploads'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+    def _staged_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, 'uploads', upload_id)
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, 'objects', sha256[:2], sha256)
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> None:
+        '''
+        Write a chunk at its offset; rewriting the same chunk on retry is
+        harmless. Only the first chunk may create the staged file: a later
+        one without it would leave a zero-filled gap in front of it.
+        '''
+        path = self._staged_path(upload_id)
+        if offset and not os.path.exists(path):
+            raise StagedUploadError(f'No staged data for upload {upload_id}')
+        with open(path, 'r+b' if offset else 'wb') as staged:
+            staged.seek(offset)
+            staged.write(data)
+
+    def finalize(self, upload_id: str, expected_size: int) -> Tuple[str, int]:
+        '''
+        Hash the staged upload block by block and move it under its SHA-256.
+        Raises StagedUploadError, discarding the staged file, when it is
+        missing or not expected_size bytes long.
+        '''
+        path = self._staged_path(upload_id)
+        if not os.path.exists(path):
+            if expected_size:
+                raise StagedUploadError(f'No staged data for upload {upload_id}')
+            open(path, 'wb').close()
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as staged:
+            for block in iter(lambda: staged.read(STREAM_BLOCK_SIZE), b''):
+                digest.update(block)
+                size += len(block)
+
+        if size != expected_size:
+            os.remove(path)
+            raise StagedUploadError(f'Upload {upload_id} has {size} of {expected_size} bytes staged')
+
+        sha256 = digest.hexdigest()
+        object_path = self._object_path(sha256)
+        if os.path.exists(object_path):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(path, object_path)
+        return sha256, size
+
+    def discard(self, upload_id: str) -> None:
+        '''Remove whatever an abandoned upload staged'''
+        path = self._staged_path(upload_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_object(self, sha256: str) -> None:
+        path = self._object_path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def read_range(self, sha256: str, start: int, end: int) -> bytes:
+        '''Read bytes start..end inclusive of a stored object'''
+        with open(self._object_path(sha256), 'rb') as stored:
+            stored.seek(start)
+            return stored.read(end - start + 1)
+
+    def download_url(self, sha256: str, file_name: str) -> Optional[str]:
+        '''Local files have no direct URL and are served through the handler'''
+        return None
+
+class S3Storage:
+    '''
+    The same content-addressed layout on an S3-compatible bucket. Chunks are
+    stored as separate objects and assembled server-side with a multipart
+    upload while hashing, holding at most one part in memory.
+    '''
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None):
+        import boto3
+        self.bucket = bucket
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def _chunk_key(self, upload_id: str, offset: int) -> str:
+        return f'uploads/{upload_id}/{offset:016d}'
+
+    def _object_key(self, sha256: str) -> str:
+        return f'objects/{sha256[:2]}/{sha256}'
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._chunk_key(upload_id, offset), Body=data)
+
+    def _iter_staged(self, upload_id: str, consumed_keys: List[str]) -> Iterator[bytes]:
+        '''Stream staged chunks in offset order, remembering their keys for cleanup'''
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'uploads/{upload_id}/'):
+            for item in page.get('Contents', []):
+                body = self.client.get_object(Bucket=self.bucket, Key=item['Key'])['Body']
+                for block in iter(lambda: body.read(STREAM_BLOCK_SIZE), b''):
+                    yield block
+                consumed_keys.append(item['Key'])
+
+    def finalize(self, upload_id: str, expected_size: int) -> Tuple[str, int]:
+        temp_key = f'uploads/{upload_id}.assembled'
+        multipart = self.client.create_multipart_upload(Bucket=self.bucket, Key=temp_key)
+        digest = hashlib.sha256()
+        size = 0
+        parts = []
+        buffer = bytearray()
+        staged_keys: List[str] = []
+
+        def flush_part() -> None:
+            part_number = len(parts) + 1
+            result = self.client.upload_part(
+                Bucket=self.bucket, Key=temp_key, UploadId=multipart['UploadId'],
+                PartNumber=part_number, Body=bytes(buffer)
+            )
+            parts.append({'PartNumber': part_number, 'ETag': result['ETag']})
+            buffer.clear()
+
+        for block in self._iter_staged(upload_id, staged_keys):
+            digest.update(block)
+            size += len(block)
+            buffer.extend(block)
+            if len(buffer) >= S3_PART_SIZE:
+                flush_part()
+        if size != expected_size:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=temp_key, UploadId=multipart['UploadId'])
+            self.discard(upload_id)
+            raise StagedUploadError(f'Upload {upload_id} has {size} of {expected_size} bytes staged')
+        if buffer or not parts:
+            flush_part()
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=temp_key, UploadId=multipart['UploadId'],
+            MultipartUpload={'Parts': parts}
+        )
+
+        sha256 = digest.hexdigest()
+        object_key = self._object_key(sha256)
+        existing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=object_key, MaxKeys=1)
+        if not existing.get('KeyCount'):
+            self.client.copy_object(
+                Bucket=self.bucket, Key=object_key,
+                CopySource={'Bucket': self.bucket, 'Key': temp_key}
+            )
+        for key in [temp_key] + staged_keys:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        return sha256, size
+
+    def discard(self, upload_id: str) -> None:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f'uploads/{upload_id}/'):
+            for item in page.get('Contents', []):
+                self.client.delete_object(Bucket=self.bucket, Key=item['Key'])
+
+    def delete_object(self, sha256: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(sha256))
+
+    def read_range(self, sha256: str, start: int, end: int) -> bytes:
+        result = self.client.get_object(
+            Bucket=self.bucket, Key=self._object_key(sha256), Range=f'bytes={start}-{end}'
+        )
+        return result['Body'].read()
+
+    def download_url(self, sha256: str, file_name: str) -> Optional[str]:
+        '''Presigned URL so full downloads go straight to the bucket'''
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self._object_key(sha256),
+                'ResponseContentDisposition': f"attachment; filename*=UTF-8''{quote(file_name)}"
+            },
+            ExpiresIn=3600
+        )
+
+_storage = None
+
+def get_storage():
+    '''
+    Storage backend selected by ATTACHMENTS_STORAGE, s3 unless set to
+    local. Every function instance has its own /tmp, so chunks sent to one
+    instance are invisible to the next: local storage is only for a single
+    process in development, and a missing S3_BUCKET is an error rather than
+    a reason to fall back to it.
+    '''
+    global _storage
+    if _storage is None:
+        if os.environ.get('ATTACHMENTS_STORAGE', 's3') == 'local':
+            _storage = LocalStorage(os.environ.get('ATTACHMENTS_DIR', '/tmp/attachments'))
+        else:
+            bucket = os.environ.get('S3_BUCKET')
+            if not bucket:
+                raise ValueError('S3_BUCKET environment variable is not set; '
+                                 'ATTACHMENTS_STORAGE=local is for single-process development only')
+            _storage = S3Storage(bucket, os.environ.get('S3_ENDPOINT_URL'))
+    return _storage
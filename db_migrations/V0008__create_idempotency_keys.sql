@@ -0,0 +1,18 @@
+-- Сохранённые ответы на POST-запросы с заголовком Idempotency-Key
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    scope VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INTEGER NOT NULL,
+    response_body TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL DEFAULT NOW() + INTERVAL '24 hours'
+);
+
+-- Уникальный ключ в рамках ресурса: повторный запрос получает сохранённый ответ
+CREATE UNIQUE INDEX IF NOT EXISTS idx_idempotency_keys_scope_key ON idempotency_keys(scope, idempotency_key);
+
+-- Индекс для пакетной очистки просроченных ключей
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+COMMENT ON TABLE idempotency_keys IS 'Stored first responses for POST requests retried with the same Idempotency-Key';
@@ -0,0 +1,9 @@
+-- Общее хранилище token bucket для ограничения частоты запросов между экземплярами функций.
+-- UNLOGGED: после сбоя корзины просто заполняются заново, зато запись не идёт в WAL
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key VARCHAR(255) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE rate_limit_buckets IS 'Shared per-client token buckets used when RATE_LIMIT_STORE=postgres';
@@ -0,0 +1,51 @@
+-- Создание месячных партиций для секционированных по дате таблиц.
+-- Используется миграциями и фоновыми задачами, чтобы заранее создавать партиции на будущие месяцы
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent_table TEXT, start_month DATE, month_count INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..month_count - 1 LOOP
+        month_start := (date_trunc('month', start_month) + make_interval(months => i))::date;
+        partition_name := parent_table || '_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent_table, month_start, (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Архив выполненных поручений, секционированный по месяцам срока выполнения
+CREATE TABLE IF NOT EXISTS tasks_archive (
+    id INTEGER NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    status VARCHAR(50) NOT NULL,
+    priority VARCHAR(20) NOT NULL,
+    assignee VARCHAR(100) NOT NULL,
+    employee_id INTEGER,
+    due_date TIMESTAMP NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL,
+    attachments JSONB DEFAULT '[]'::jsonb,
+    archived_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, due_date)
+) PARTITION BY RANGE (due_date);
+
+-- Партиция по умолчанию для строк вне созданных месяцев
+CREATE TABLE IF NOT EXISTS tasks_archive_default PARTITION OF tasks_archive DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_due_date ON tasks_archive(due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_assignee ON tasks_archive(assignee);
+
+-- Партиции за последние два года и на три месяца вперёд
+SELECT ensure_monthly_partitions('tasks_archive', (date_trunc('month', NOW()) - INTERVAL '24 months')::date, 28);
+
+COMMENT ON TABLE tasks_archive IS 'Completed tasks moved out of the hot tasks table, range-partitioned by month of due_date';
@@ -0,0 +1,18 @@
+-- Журнал изменений поручений: только изменённые поля в виде {"поле": {"from": ..., "to": ...}}
+CREATE TABLE IF NOT EXISTS task_history (
+    task_id INTEGER NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    changed_by INTEGER,
+    changes JSONB NOT NULL
+) PARTITION BY RANGE (changed_at);
+
+-- Партиция по умолчанию на случай, если партиция месяца ещё не создана
+CREATE TABLE IF NOT EXISTS task_history_default PARTITION OF task_history DEFAULT;
+
+-- Чтение истории одного поручения по времени изменения
+CREATE INDEX IF NOT EXISTS idx_task_history_task_id_changed_at ON task_history(task_id, changed_at);
+
+-- Партиции на текущий месяц и три месяца вперёд
+SELECT ensure_monthly_partitions('task_history', date_trunc('month', NOW())::date, 4);
+
+COMMENT ON TABLE task_history IS 'Append-only per-column diffs of task updates, range-partitioned by month of changed_at';
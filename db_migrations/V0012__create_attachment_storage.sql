@@ -0,0 +1,21 @@
+-- Загружаемые по частям файлы: сколько байт уже принято, чтобы клиент мог продолжить загрузку
+CREATE TABLE IF NOT EXISTS attachment_uploads (
+    id UUID PRIMARY KEY,
+    file_name VARCHAR(255) NOT NULL,
+    content_type VARCHAR(255) NOT NULL DEFAULT 'application/octet-stream',
+    total_size BIGINT NOT NULL,
+    received_size BIGINT NOT NULL DEFAULT 0,
+    sha256 CHAR(64),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    completed_at TIMESTAMP
+);
+
+-- Хранимые файлы, адресуемые по SHA-256: одинаковые загрузки хранятся один раз
+CREATE TABLE IF NOT EXISTS attachment_objects (
+    sha256 CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    content_type VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON COLUMN tasks.attachments IS 'Array of attachment references: [{id, sha256, name, size, contentType, url, uploadedAt}]';
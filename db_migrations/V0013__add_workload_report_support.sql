@@ -0,0 +1,54 @@
+-- Привязка поручений к сотрудникам по ФИО исполнителя, как и при миграции V0002
+UPDATE tasks t SET employee_id = e.id FROM employees e WHERE t.assignee = e.full_name AND t.employee_id IS NULL;
+
+CREATE OR REPLACE FUNCTION set_task_employee_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.employee_id := (SELECT id FROM employees WHERE full_name = NEW.assignee ORDER BY id LIMIT 1);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_set_employee_id ON tasks;
+CREATE TRIGGER tasks_set_employee_id
+    BEFORE INSERT OR UPDATE OF assignee ON tasks
+    FOR EACH ROW EXECUTE FUNCTION set_task_employee_id();
+
+-- Индекс под отчёт о загрузке: открытые поручения сотрудника по сроку
+CREATE INDEX IF NOT EXISTS idx_tasks_employee_status_due ON tasks(employee_id, status, due_date);
+
+-- Счётчики версий данных для инвалидации кэша отчётов.
+-- Последовательности не блокируют параллельные записи, в отличие от строки-счётчика
+CREATE SEQUENCE IF NOT EXISTS tasks_data_version;
+CREATE SEQUENCE IF NOT EXISTS employees_data_version;
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM nextval(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_bump_data_version ON tasks;
+CREATE TRIGGER tasks_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('tasks_data_version');
+
+DROP TRIGGER IF EXISTS employees_bump_data_version ON employees;
+CREATE TRIGGER employees_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employees
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('employees_data_version');
+
+DROP TRIGGER IF EXISTS employee_groups_bump_data_version ON employee_groups;
+CREATE TRIGGER employee_groups_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employee_groups
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('employees_data_version');
+
+-- Общий для всех экземпляров функции кэш готовых отчётов
+CREATE TABLE IF NOT EXISTS report_cache (
+    cache_key VARCHAR(100) PRIMARY KEY,
+    data_version VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL,
+    computed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
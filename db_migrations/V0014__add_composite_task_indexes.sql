@@ -0,0 +1,28 @@
+-- Индексы под реальные запросы обработчиков: список поручений фильтруется
+-- по статусу и/или приоритету и всегда сортируется по сроку
+CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks(status, due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_priority_due ON tasks(status, priority, due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority_due ON tasks(priority, due_date);
+
+-- В архиве все поручения завершены, поэтому фильтруется только приоритет.
+-- Индекс по сроку внутри приоритета позволяет склеить архив с текущими
+-- поручениями без сортировки
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_priority_due ON tasks_archive(priority, due_date);
+
+-- Одноколоночные индексы покрываются составными и только замедляют запись
+DROP INDEX IF EXISTS idx_tasks_status;
+DROP INDEX IF EXISTS idx_tasks_priority;
+
+-- Архивация выбирает завершённые поручения по сроку
+CREATE INDEX IF NOT EXISTS idx_tasks_completed_due ON tasks(due_date) WHERE status = 'completed';
+
+-- Проверка прав руководителя группы: поручение -> сотрудник по ФИО -> группа
+CREATE INDEX IF NOT EXISTS idx_employees_full_name_group ON employees(full_name, group_id);
+DROP INDEX IF EXISTS idx_employees_full_name;
+
+-- Список сотрудников группы, отсортированный по ФИО
+CREATE INDEX IF NOT EXISTS idx_employees_group_full_name ON employees(group_id, full_name);
+DROP INDEX IF EXISTS idx_employees_group_id;
+
+-- Дублирует индекс ограничения UNIQUE(username)
+DROP INDEX IF EXISTS idx_users_username;
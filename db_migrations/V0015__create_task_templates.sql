@@ -0,0 +1,42 @@
+-- Шаблоны повторяющихся поручений. Расписание задаётся по образцу RRULE:
+-- частота (FREQ), интервал (INTERVAL), дата начала (DTSTART) и окончания (UNTIL)
+CREATE TABLE IF NOT EXISTS task_templates (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+    assignee VARCHAR(100) NOT NULL,
+    frequency VARCHAR(10) NOT NULL,
+    interval_count INTEGER NOT NULL DEFAULT 1,
+    starts_on DATE NOT NULL,
+    until_date DATE,
+    due_time TIME NOT NULL DEFAULT '23:59:59',
+    lead_days INTEGER NOT NULL DEFAULT 7,
+    generated_until DATE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT template_priority_check CHECK (priority IN ('high', 'medium', 'low')),
+    CONSTRAINT template_frequency_check CHECK (frequency IN ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')),
+    CONSTRAINT template_interval_check CHECK (interval_count > 0),
+    CONSTRAINT template_lead_days_check CHECK (lead_days BETWEEN 0 AND 366)
+);
+
+-- Генератор выбирает активные незавершённые шаблоны, у которых поручения созданы
+-- не на весь горизонт: COALESCE(generated_until, starts_on - 1) - lead_days < CURRENT_DATE
+CREATE INDEX IF NOT EXISTS idx_task_templates_next_due
+    ON task_templates ((COALESCE(generated_until, starts_on - 1) - lead_days))
+    WHERE is_active AND (until_date IS NULL OR generated_until IS NULL OR generated_until < until_date);
+
+-- Поручение помнит шаблон и дату вхождения; уникальный ключ делает
+-- повторный запуск генератора безопасным
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS template_id INTEGER REFERENCES task_templates(id) ON DELETE SET NULL;
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS occurrence_date DATE;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_template_occurrence ON tasks(template_id, occurrence_date);
+
+-- Ежемесячные отчёты групп мониторинга (V0005) в последний день месяца
+INSERT INTO task_templates (title, description, priority, assignee, frequency, starts_on)
+SELECT 'Ежемесячный отчёт: ' || g.name, 'Итоги мониторинга за месяц', 'high', e.full_name, 'MONTHLY', DATE '2025-01-31'
+FROM employee_groups g
+JOIN employees e ON e.group_id = g.id
+WHERE g.id IN (1, 2)
+  AND e.id = (SELECT MIN(id) FROM employees WHERE group_id = g.id);
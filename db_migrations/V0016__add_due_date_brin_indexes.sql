@@ -0,0 +1,14 @@
+-- Поручения добавляются примерно в порядке сроков, а архив раскладывается
+-- по месячным секциям, поэтому физический порядок строк следует за due_date.
+-- BRIN хранит минимум и максимум срока на диапазон страниц: индекс в сотни
+-- раз меньше B-дерева и почти не замедляет запись, а выборки за неделю или
+-- месяц (фильтры dueFrom/dueTo и календарь) читают только нужные диапазоны.
+-- autosummarize описывает новые диапазоны сразу, не дожидаясь VACUUM
+CREATE INDEX IF NOT EXISTS idx_tasks_due_brin ON tasks
+    USING brin (due_date) WITH (pages_per_range = 32, autosummarize = on);
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_due_brin ON tasks_archive
+    USING brin (due_date) WITH (pages_per_range = 32, autosummarize = on);
+
+-- B-дерево по сроку не используется: полный список сортируется целиком,
+-- а фильтры по статусу и приоритету обслуживают составные индексы V0014
+DROP INDEX IF EXISTS idx_tasks_due_date;
@@ -0,0 +1,54 @@
+-- Строки месяца без своей партиции попадают в партицию по умолчанию, после чего
+-- CREATE TABLE ... PARTITION OF для этого месяца падает на проверке DEFAULT.
+-- Новая версия функции создаёт партицию отдельной таблицей, переносит в неё
+-- строки её диапазона из партиции по умолчанию и только затем подключает.
+-- Партиция по умолчанию блокируется на время переноса, чтобы новые строки
+-- диапазона не попали в неё между переносом и подключением
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent_table TEXT, start_month DATE, month_count INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    default_partition REGCLASS;
+    key_column TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT NULLIF(p.partdefid, 0)::regclass, a.attname
+    INTO default_partition, key_column
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent_table::regclass;
+
+    FOR i IN 0..month_count - 1 LOOP
+        month_start := (date_trunc('month', start_month) + make_interval(months => i))::date;
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := parent_table || '_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF default_partition IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, parent_table, month_start, month_end
+                );
+            ELSE
+                EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', default_partition);
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                    partition_name, parent_table
+                );
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    default_partition, key_column, month_start, key_column, month_end, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent_table, partition_name, month_start, month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,6 @@
+-- Несколько изменений поручения могут иметь одинаковое changed_at, поэтому
+-- страницы истории продолжаются по паре (changed_at, id), а не только по времени
+ALTER TABLE task_history ADD COLUMN IF NOT EXISTS id BIGSERIAL;
+
+CREATE INDEX IF NOT EXISTS idx_task_history_task_id_changed_at_id ON task_history(task_id, changed_at, id);
+DROP INDEX IF EXISTS idx_task_history_task_id_changed_at;
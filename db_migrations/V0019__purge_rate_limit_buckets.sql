@@ -0,0 +1,6 @@
+-- Ключи корзин теперь SHA-256 от адреса клиента вместо сырых токенов и
+-- идентификаторов из заголовков; старые корзины больше не нужны
+TRUNCATE rate_limit_buckets;
+
+-- Простаивающие корзины периодически удаляются по времени обновления
+CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at ON rate_limit_buckets(updated_at);
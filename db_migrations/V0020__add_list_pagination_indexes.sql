@@ -0,0 +1,4 @@
+-- Списки читаются страницами по ключу (due_date, id): B-дерево по этой паре
+-- отдаёт первую и следующие страницы полного списка без сортировки всей таблицы
+CREATE INDEX IF NOT EXISTS idx_tasks_due_id ON tasks(due_date, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_archive_due_id ON tasks_archive(due_date, id);
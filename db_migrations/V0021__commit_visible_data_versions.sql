@@ -0,0 +1,37 @@
+-- nextval() виден другим сеансам сразу, ещё до фиксации записи: отчёт,
+-- посчитанный в этот момент по старым данным, попадал в кэш с новой версией.
+-- Строка-счётчик обновляется в транзакции записи и становится видна только
+-- вместе с её данными. Параллельные записи ждут блокировку строки до фиксации,
+-- но каждая запись обработчиков фиксируется сразу после своего запроса
+CREATE TABLE IF NOT EXISTS data_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO data_versions (name) VALUES ('tasks'), ('employees') ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE data_versions SET version = version + 1 WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_bump_data_version ON tasks;
+CREATE TRIGGER tasks_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('tasks');
+
+DROP TRIGGER IF EXISTS employees_bump_data_version ON employees;
+CREATE TRIGGER employees_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employees
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('employees');
+
+DROP TRIGGER IF EXISTS employee_groups_bump_data_version ON employee_groups;
+CREATE TRIGGER employee_groups_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employee_groups
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('employees');
+
+DROP SEQUENCE IF EXISTS tasks_data_version;
+DROP SEQUENCE IF EXISTS employees_data_version;
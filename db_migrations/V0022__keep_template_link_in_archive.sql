@@ -0,0 +1,5 @@
+-- Архив сохраняет шаблон и дату вхождения повторяющегося поручения (V0015),
+-- чтобы после переноса было видно, из какого расписания оно создано.
+-- Внешний ключ не нужен: архив хранит историю и переживает удаление шаблона
+ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS template_id INTEGER;
+ALTER TABLE tasks_archive ADD COLUMN IF NOT EXISTS occurrence_date DATE;
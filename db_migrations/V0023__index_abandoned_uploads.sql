@@ -0,0 +1,4 @@
+-- Плановое обслуживание удаляет загрузки, не завершённые за сутки, вместе
+-- с их частями. Частичный индекс содержит только незавершённые загрузки
+CREATE INDEX IF NOT EXISTS idx_attachment_uploads_abandoned
+    ON attachment_uploads(created_at) WHERE completed_at IS NULL;
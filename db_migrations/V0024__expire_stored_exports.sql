@@ -0,0 +1,8 @@
+-- Большие выгрузки сохраняются как файлы и отдаются по перенаправлению.
+-- Они нужны лишь сразу после запроса: expires_at задаёт срок хранения,
+-- после которого плановое обслуживание удаляет файл. У вложений поручений
+-- срока нет (NULL)
+ALTER TABLE attachment_objects ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_attachment_objects_expires_at
+    ON attachment_objects(expires_at) WHERE expires_at IS NOT NULL;
@@ -0,0 +1,41 @@
+-- Строка data_versions из V0021 блокировалась каждой записью до фиксации,
+-- и все записи поручений выстраивались за ней в очередь. Возвращаем
+-- последовательности из V0013: nextval() не блокирует параллельные записи.
+-- Чтобы новая версия не становилась видна раньше данных, счётчик сдвигает
+-- отложенный триггер ограничения: он срабатывает при фиксации транзакции,
+-- а не при первой записи
+CREATE SEQUENCE IF NOT EXISTS tasks_data_version;
+CREATE SEQUENCE IF NOT EXISTS employees_data_version;
+
+-- Продолжаем с текущих значений, чтобы версии в report_cache не повторились
+SELECT setval('tasks_data_version', (SELECT version + 1 FROM data_versions WHERE name = 'tasks'));
+SELECT setval('employees_data_version', (SELECT version + 1 FROM data_versions WHERE name = 'employees'));
+
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM nextval(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры ограничения бывают только построчными; nextval() на строку дёшев
+DROP TRIGGER IF EXISTS tasks_bump_data_version ON tasks;
+CREATE CONSTRAINT TRIGGER tasks_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION bump_data_version('tasks_data_version');
+
+DROP TRIGGER IF EXISTS employees_bump_data_version ON employees;
+CREATE CONSTRAINT TRIGGER employees_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employees
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION bump_data_version('employees_data_version');
+
+DROP TRIGGER IF EXISTS employee_groups_bump_data_version ON employee_groups;
+CREATE CONSTRAINT TRIGGER employee_groups_bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE ON employee_groups
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION bump_data_version('employees_data_version');
+
+DROP TABLE IF EXISTS data_versions;
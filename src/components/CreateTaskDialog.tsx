@@ -13,6 +13,7 @@ import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import FileUpload from '@/components/FileUpload';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface Employee {
   id: string;
@@ -51,6 +52,7 @@ const CreateTaskDialog = ({ onTaskCreated }: CreateTaskDialogProps) => {
     size: number;
     uploadedAt: string;
   }>>([]);
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
 
   useEffect(() => {
     if (open) {
@@ -67,7 +69,7 @@ const CreateTaskDialog = ({ onTaskCreated }: CreateTaskDialogProps) => {
         url += `&group_id=${user.groupId}`;
       }
       
-      const response = await fetch(url);
+      const response = await apiFetch(url);
       const data = await response.json();
       setEmployees(data.employees || []);
     } catch (error) {
@@ -95,10 +97,11 @@ const CreateTaskDialog = ({ onTaskCreated }: CreateTaskDialogProps) => {
     setLoading(true);
 
     try {
-      const response = await fetch(TASKS_API_URL, {
+      const response = await apiFetch(TASKS_API_URL, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': idempotencyKey,
         },
         body: JSON.stringify({
           title: formData.title,
@@ -129,6 +132,7 @@ const CreateTaskDialog = ({ onTaskCreated }: CreateTaskDialogProps) => {
       });
       setDueDate(undefined);
       setAttachments([]);
+      setIdempotencyKey(crypto.randomUUID());
       setOpen(false);
       onTaskCreated();
     } catch (error) {
@@ -4,6 +4,7 @@ import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface Employee {
   id: string;
@@ -37,7 +38,7 @@ const DepartmentStructure = () => {
   const fetchStructure = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`${EMPLOYEES_API_URL}?resource=department-structure`);
+      const response = await apiFetch(`${EMPLOYEES_API_URL}?resource=department-structure`);
       const data = await response.json();
       setStructure(data.structure || []);
     } catch (error) {
@@ -10,6 +10,7 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface Employee {
   id: string;
@@ -49,6 +50,8 @@ const EmployeeManagement = () => {
     groupId: '',
   });
 
+  const [employeeIdempotencyKey, setEmployeeIdempotencyKey] = useState(() => crypto.randomUUID());
+
   const [groupForm, setGroupForm] = useState({
     name: '',
     description: '',
@@ -67,8 +70,8 @@ const EmployeeManagement = () => {
     try {
       setLoading(true);
       const [employeesRes, groupsRes] = await Promise.all([
-        fetch(`${EMPLOYEES_API_URL}?resource=employees`),
-        fetch(`${EMPLOYEES_API_URL}?resource=groups`),
+        apiFetch(`${EMPLOYEES_API_URL}?resource=employees`),
+        apiFetch(`${EMPLOYEES_API_URL}?resource=groups`),
       ]);
 
       const employeesData = await employeesRes.json();
@@ -101,9 +104,9 @@ const EmployeeManagement = () => {
     }
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}?resource=employees`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}?resource=employees`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': employeeIdempotencyKey },
         body: JSON.stringify({
           fullName: employeeForm.fullName,
           email: employeeForm.email,
@@ -116,6 +119,7 @@ const EmployeeManagement = () => {
 
       toast({ title: 'Успешно!', description: 'Сотрудник добавлен' });
       setEmployeeForm({ fullName: '', email: '', position: '', groupId: '' });
+      setEmployeeIdempotencyKey(crypto.randomUUID());
       setOpenEmployeeDialog(false);
       fetchData();
     } catch (error) {
@@ -133,7 +137,7 @@ const EmployeeManagement = () => {
     }
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}?resource=groups`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}?resource=groups`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ name: groupForm.name, description: groupForm.description }),
@@ -167,7 +171,7 @@ const EmployeeManagement = () => {
     }
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}/${editingGroup.id}?resource=groups`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}/${editingGroup.id}?resource=groups`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ name: editGroupForm.name, description: editGroupForm.description }),
@@ -189,7 +193,7 @@ const EmployeeManagement = () => {
     if (!confirm('Вы уверены, что хотите удалить этого сотрудника?')) return;
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}/${employeeId}?resource=employees`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}/${employeeId}?resource=employees`, {
         method: 'DELETE',
       });
 
@@ -207,7 +211,7 @@ const EmployeeManagement = () => {
     if (!confirm('Вы уверены, что хотите удалить эту группу? Все сотрудники группы останутся без группы.')) return;
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}/${groupId}?resource=groups`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}/${groupId}?resource=groups`, {
         method: 'DELETE',
       });
 
@@ -3,12 +3,16 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface FileAttachment {
   id: string;
+  sha256?: string;
   name: string;
   url: string;
   size: number;
+  contentType?: string;
   uploadedAt: string;
 }
 
@@ -18,6 +22,65 @@ interface FileUploadProps {
   disabled?: boolean;
 }
 
+const TASKS_API_URL = API_URLS.tasks;
+const ATTACHMENTS_API_URL = `${TASKS_API_URL}?resource=attachments`;
+const MAX_OFFSET_CONFLICTS = 3;
+// Same cap as MAX_UPLOAD_SIZE in backend/tasks/attachments.py
+const MAX_FILE_SIZE = 10 * 1024 * 1024;
+
+const readChunkAsBase64 = (chunk: Blob): Promise<string> =>
+  new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve((reader.result as string).split(',')[1] || '');
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(chunk);
+  });
+
+const uploadFile = async (file: File): Promise<FileAttachment> => {
+  const createResponse = await apiFetch(ATTACHMENTS_API_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      name: file.name,
+      size: file.size,
+      contentType: file.type || 'application/octet-stream',
+    }),
+  });
+  if (!createResponse.ok) throw new Error('Failed to start upload');
+  const { uploadId, chunkSize } = await createResponse.json();
+
+  let offset = 0;
+  let conflicts = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + chunkSize);
+    const chunkResponse = await apiFetch(`${ATTACHMENTS_API_URL}&uploadId=${uploadId}&offset=${offset}`, {
+      method: 'PUT',
+      headers: { 'Content-Type': 'text/plain' },
+      body: await readChunkAsBase64(chunk),
+    });
+    const chunkData = await chunkResponse.json();
+
+    if (chunkResponse.status === 409 && typeof chunkData.receivedSize === 'number' && conflicts < MAX_OFFSET_CONFLICTS) {
+      conflicts += 1;
+      offset = chunkData.receivedSize;
+      continue;
+    }
+    if (!chunkResponse.ok) throw new Error('Failed to upload chunk');
+    offset = chunkData.receivedSize;
+  }
+
+  const completeResponse = await apiFetch(`${ATTACHMENTS_API_URL}&uploadId=${uploadId}&action=complete`, {
+    method: 'POST',
+  });
+  if (!completeResponse.ok) throw new Error('Failed to complete upload');
+  const { attachment } = await completeResponse.json();
+
+  return {
+    ...attachment,
+    url: `${ATTACHMENTS_API_URL}&sha256=${attachment.sha256}&name=${encodeURIComponent(attachment.name)}`,
+  };
+};
+
 const FileUpload = ({ attachments, onChange, disabled }: FileUploadProps) => {
   const [uploading, setUploading] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
@@ -43,7 +106,7 @@ const FileUpload = ({ attachments, onChange, disabled }: FileUploadProps) => {
       for (let i = 0; i < files.length; i++) {
         const file = files[i];
 
-        if (file.size > 10 * 1024 * 1024) {
+        if (file.size > MAX_FILE_SIZE) {
           toast({
             title: 'Ошибка',
             description: `Файл ${file.name} превышает 10MB`,
@@ -52,15 +115,7 @@ const FileUpload = ({ attachments, onChange, disabled }: FileUploadProps) => {
           continue;
         }
 
-        const fileData: FileAttachment = {
-          id: `${Date.now()}-${i}`,
-          name: file.name,
-          url: URL.createObjectURL(file),
-          size: file.size,
-          uploadedAt: new Date().toISOString(),
-        };
-
-        newAttachments.push(fileData);
+        newAttachments.push(await uploadFile(file));
       }
 
       onChange([...attachments, ...newAttachments]);
@@ -6,6 +6,7 @@ import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface User {
   id: string;
@@ -51,7 +52,7 @@ const ProfileSettings = () => {
 
   const fetchEmployeeDetails = async (employeeId: string) => {
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}?resource=employees`);
+      const response = await apiFetch(`${EMPLOYEES_API_URL}?resource=employees`);
       const data = await response.json();
       const employee = data.employees.find((e: any) => e.id === employeeId);
       
@@ -82,7 +83,7 @@ const ProfileSettings = () => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${EMPLOYEES_API_URL}/${user.employeeId}?resource=employees`, {
+      const response = await apiFetch(`${EMPLOYEES_API_URL}/${user.employeeId}?resource=employees`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
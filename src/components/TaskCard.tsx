@@ -23,6 +23,8 @@ import { format } from 'date-fns';
 import { ru } from 'date-fns/locale';
 import { useToast } from '@/hooks/use-toast';
 import { API_URLS } from '@/config/api';
+import { downloadFile } from '@/lib/download';
+import { apiFetch } from '@/lib/api';
 
 interface Task {
   id: string;
@@ -57,6 +59,21 @@ const TaskCard = ({ task, onTaskUpdated, userRole, userGroupId }: TaskCardProps)
 
   const canEdit = userRole === 'department_head' || userRole === 'group_head';
 
+  const handleDownload = async (event: React.MouseEvent, url: string, fileName: string) => {
+    event.preventDefault();
+    try {
+      await downloadFile(url, fileName);
+    } catch (error: any) {
+      console.error('Error downloading file:', error);
+      toast({
+        title: 'Ошибка',
+        description: error.message || 'Не удалось скачать файл',
+        variant: 'destructive',
+      });
+    }
+  };
+  const userId = JSON.parse(localStorage.getItem('user') || '{}').id || '';
+
   const getStatusBadge = (status: Task['status']) => {
     const variants: Record<Task['status'], { variant: any; label: string }> = {
       completed: { variant: 'default', label: 'Выполнено' },
@@ -87,12 +104,13 @@ const TaskCard = ({ task, onTaskUpdated, userRole, userGroupId }: TaskCardProps)
   const handleStatusChange = async (newStatus: string) => {
     setLoading(true);
     try {
-      const response = await fetch(`${TASKS_API_URL}/${task.id}`, {
+      const response = await apiFetch(`${TASKS_API_URL}/${task.id}`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Role': userRole,
           'X-User-Group-Id': userGroupId || '',
+          'X-User-Id': userId,
         },
         body: JSON.stringify({ status: newStatus }),
       });
@@ -124,7 +142,7 @@ const TaskCard = ({ task, onTaskUpdated, userRole, userGroupId }: TaskCardProps)
   const handleDelete = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${TASKS_API_URL}/${task.id}`, {
+      const response = await apiFetch(`${TASKS_API_URL}/${task.id}`, {
         method: 'DELETE',
         headers: {
           'X-User-Role': userRole,
@@ -197,8 +215,7 @@ const TaskCard = ({ task, onTaskUpdated, userRole, userGroupId }: TaskCardProps)
                       <a
                         key={file.id}
                         href={file.url}
-                        target="_blank"
-                        rel="noopener noreferrer"
+                        onClick={(event) => handleDownload(event, file.url, file.name)}
                         className="inline-flex items-center gap-2 px-2 py-1 rounded bg-muted hover:bg-muted/80 transition-colors text-xs"
                       >
                         <Icon name="FileText" size={12} />
@@ -0,0 +1,25 @@
+// fetch for the backend functions: sends the session token, by which the
+// rate limiter tells users apart, and waits out 429 (and 503 on reads) as
+// long as Retry-After says instead of failing the whole view
+const MAX_RETRIES = 5;
+const MAX_RETRY_DELAY_MS = 10000;
+
+const retryDelay = (response: Response, attempt: number): number => {
+  const retryAfter = Number(response.headers.get('Retry-After'));
+  const delay = retryAfter > 0 ? retryAfter * 1000 : 500 * 2 ** attempt;
+  return Math.min(delay, MAX_RETRY_DELAY_MS) * (1 + Math.random() * 0.2);
+};
+
+export async function apiFetch(url: string, init: RequestInit = {}): Promise<Response> {
+  const headers = new Headers(init.headers);
+  const sessionToken = localStorage.getItem('sessionToken');
+  if (sessionToken && !headers.has('X-Session-Token')) headers.set('X-Session-Token', sessionToken);
+
+  const method = (init.method || 'GET').toUpperCase();
+  for (let attempt = 0; ; attempt++) {
+    const response = await fetch(url, { ...init, headers });
+    const retryable = response.status === 429 || (response.status === 503 && method === 'GET');
+    if (!retryable || attempt >= MAX_RETRIES) return response;
+    await new Promise((resolve) => setTimeout(resolve, retryDelay(response, attempt)));
+  }
+}
@@ -0,0 +1,52 @@
+import { apiFetch } from './api';
+
+// Just under MAX_RESPONSE_BYTES in backend/tasks/downloads.py: larger
+// files are only served in ranges, so they are fetched part by part
+const RANGE_SIZE = 2 * 1024 * 1024;
+
+// Total size from "Content-Range: bytes 0-99/1234", null when absent
+const totalSize = (response: Response): number | null => {
+  const match = /\/(\d+)$/.exec(response.headers.get('Content-Range') || '');
+  return match ? Number(match[1]) : null;
+};
+
+const fetchParts = async (url: string): Promise<Blob> => {
+  const parts: Blob[] = [];
+  let contentType = '';
+  let start = 0;
+
+  for (;;) {
+    const response = await apiFetch(url, {
+      headers: { Range: `bytes=${start}-${start + RANGE_SIZE - 1}` },
+    });
+
+    // Nothing left: empty file or the size is a multiple of RANGE_SIZE
+    if (response.status === 416) break;
+    if (!response.ok) throw new Error(`Download failed with status ${response.status}`);
+
+    const part = await response.blob();
+    contentType = contentType || response.headers.get('Content-Type') || '';
+    parts.push(part);
+
+    // 200 means the whole file came at once (storage ignored the range);
+    // the server may send less than asked, so go by the total size
+    if (response.status === 200 || part.size === 0) break;
+    start += part.size;
+    const total = totalSize(response);
+    if (total === null ? part.size < RANGE_SIZE : start >= total) break;
+  }
+
+  return new Blob(parts, { type: contentType });
+};
+
+export const downloadFile = async (url: string, fileName: string): Promise<void> => {
+  const blob = await fetchParts(url);
+  const objectUrl = URL.createObjectURL(blob);
+  const link = document.createElement('a');
+  link.href = objectUrl;
+  link.download = fileName;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  URL.revokeObjectURL(objectUrl);
+};
@@ -17,6 +17,7 @@ import DepartmentStructure from '@/components/DepartmentStructure';
 import TaskCard from '@/components/TaskCard';
 import ProfileSettings from '@/components/ProfileSettings';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 interface Task {
   id: string;
@@ -49,16 +50,27 @@ const Index = () => {
   const [filterAssignee, setFilterAssignee] = useState<string>('all');
   const [searchQuery, setSearchQuery] = useState('');
   const [assignees, setAssignees] = useState<string[]>([]);
+  const [calendarMonth, setCalendarMonth] = useState<Date>(new Date());
+  const [calendarDays, setCalendarDays] = useState<Record<string, number>>({});
+  const [dayTasks, setDayTasks] = useState<Task[]>([]);
   const user = JSON.parse(localStorage.getItem('user') || '{}');
 
   useEffect(() => {
     fetchTasks();
   }, []);
 
+  useEffect(() => {
+    fetchCalendarMonth(calendarMonth);
+  }, [calendarMonth]);
+
+  useEffect(() => {
+    fetchDayTasks(selectedDate);
+  }, [selectedDate]);
+
   const fetchTasks = async () => {
     try {
       setLoading(true);
-      const response = await fetch(API_URL);
+      const response = await apiFetch(API_URL);
       const data = await response.json();
       const tasksData = data.tasks.map((task: any) => ({
         ...task,
@@ -77,6 +89,46 @@ const Index = () => {
     }
   };
 
+  const fetchCalendarMonth = async (month: Date) => {
+    try {
+      const response = await apiFetch(`${API_URL}?resource=calendar&month=${format(month, 'yyyy-MM')}&includeArchived=true`);
+      const data = await response.json();
+      const totals: Record<string, number> = {};
+      data.days.forEach((day: { date: string; total: number }) => {
+        totals[day.date] = day.total;
+      });
+      setCalendarDays(totals);
+    } catch (error) {
+      console.error('Error fetching calendar:', error);
+    }
+  };
+
+  const fetchDayTasks = async (date: Date | undefined) => {
+    if (!date) {
+      setDayTasks([]);
+      return;
+    }
+    try {
+      const day = format(date, 'yyyy-MM-dd');
+      const response = await apiFetch(`${API_URL}?dueFrom=${day}&dueTo=${day}&includeArchived=true`);
+      const data = await response.json();
+      setDayTasks(data.tasks.map((task: any) => ({
+        ...task,
+        dueDate: new Date(task.dueDate),
+        createdAt: new Date(task.createdAt),
+        updatedAt: task.updatedAt ? new Date(task.updatedAt) : undefined,
+      })));
+    } catch (error) {
+      console.error('Error fetching tasks for date:', error);
+    }
+  };
+
+  const refreshTasks = () => {
+    fetchTasks();
+    fetchCalendarMonth(calendarMonth);
+    fetchDayTasks(selectedDate);
+  };
+
   const completedTasks = tasks.filter((t) => t.status === 'completed').length;
   const inProgressTasks = tasks.filter((t) => t.status === 'in-progress').length;
   const overdueTasks = tasks.filter((t) => t.status === 'overdue').length;
@@ -159,7 +211,7 @@ const Index = () => {
             </Button>
           </div>
         </div>
-        <CreateTaskDialog onTaskCreated={fetchTasks} />
+        <CreateTaskDialog onTaskCreated={refreshTasks} />
 
         <Tabs defaultValue="dashboard" className="space-y-6">
           <TabsList className="grid w-full max-w-4xl grid-cols-6">
@@ -367,7 +419,7 @@ const Index = () => {
                     <TaskCard
                       key={task.id}
                       task={task}
-                      onTaskUpdated={fetchTasks}
+                      onTaskUpdated={refreshTasks}
                       userRole={user.role}
                       userGroupId={user.groupId}
                     />
@@ -388,6 +440,10 @@ const Index = () => {
                     mode="single"
                     selected={selectedDate}
                     onSelect={setSelectedDate}
+                    month={calendarMonth}
+                    onMonthChange={setCalendarMonth}
+                    modifiers={{ hasTasks: (date) => Boolean(calendarDays[format(date, 'yyyy-MM-dd')]) }}
+                    modifiersClassNames={{ hasTasks: 'font-bold underline' }}
                     locale={ru}
                     className="rounded-md border"
                   />
@@ -401,37 +457,34 @@ const Index = () => {
                   </CardTitle>
                 </CardHeader>
                 <CardContent className="space-y-3">
-                  {tasks
-                    .filter((task) => selectedDate && task.dueDate.toDateString() === selectedDate.toDateString())
-                    .map((task) => (
-                      <Card key={task.id}>
-                        <CardContent className="p-4">
-                          <div className="flex items-start justify-between gap-3">
-                            <div className="flex-1">
-                              <div className="flex items-center gap-2 mb-1">
-                                <h3 className="font-semibold">{task.title}</h3>
-                                <Badge {...getStatusBadge(task.status)} className="text-xs">
-                                  {getStatusBadge(task.status).label}
-                                </Badge>
-                              </div>
-                              <p className="text-sm text-muted-foreground mb-2">{task.description}</p>
-                              <div className="flex items-center gap-2 text-sm">
-                                <Icon name="User" size={14} className="text-muted-foreground" />
-                                <span>{task.assignee}</span>
-                              </div>
+                  {dayTasks.map((task) => (
+                    <Card key={task.id}>
+                      <CardContent className="p-4">
+                        <div className="flex items-start justify-between gap-3">
+                          <div className="flex-1">
+                            <div className="flex items-center gap-2 mb-1">
+                              <h3 className="font-semibold">{task.title}</h3>
+                              <Badge {...getStatusBadge(task.status)} className="text-xs">
+                                {getStatusBadge(task.status).label}
+                              </Badge>
+                            </div>
+                            <p className="text-sm text-muted-foreground mb-2">{task.description}</p>
+                            <div className="flex items-center gap-2 text-sm">
+                              <Icon name="User" size={14} className="text-muted-foreground" />
+                              <span>{task.assignee}</span>
                             </div>
-                            <Icon name="Flag" size={20} className={getPriorityColor(task.priority)} />
                           </div>
-                        </CardContent>
-                      </Card>
-                    ))}
-                  {selectedDate &&
-                    tasks.filter((task) => task.dueDate.toDateString() === selectedDate.toDateString()).length === 0 && (
-                      <div className="text-center py-12">
-                        <Icon name="CalendarOff" className="mx-auto text-muted-foreground mb-3" size={48} />
-                        <p className="text-muted-foreground">На эту дату поручений нет</p>
-                      </div>
-                    )}
+                          <Icon name="Flag" size={20} className={getPriorityColor(task.priority)} />
+                        </div>
+                      </CardContent>
+                    </Card>
+                  ))}
+                  {selectedDate && dayTasks.length === 0 && (
+                    <div className="text-center py-12">
+                      <Icon name="CalendarOff" className="mx-auto text-muted-foreground mb-3" size={48} />
+                      <p className="text-muted-foreground">На эту дату поручений нет</p>
+                    </div>
+                  )}
                 </CardContent>
               </Card>
             </div>
@@ -7,6 +7,7 @@ import { Label } from '@/components/ui/label';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
 import { API_URLS } from '@/config/api';
+import { apiFetch } from '@/lib/api';
 
 const AUTH_API_URL = API_URLS.employees;
 
@@ -32,7 +33,7 @@ const Login = () => {
     setLoading(true);
 
     try {
-      const response = await fetch(`${AUTH_API_URL}?resource=auth`, {
+      const response = await apiFetch(`${AUTH_API_URL}?resource=auth`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
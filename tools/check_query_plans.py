@@ -0,0 +1,353 @@
+'''
+Query plan regression check for the backend functions.
+
+Seeds the database with a realistic department at scale inside a single
+transaction, then captures EXPLAIN (ANALYZE, FORMAT JSON) for every
+registered statement of both functions under custom and generic plans,
+and for the export queries built per request, and fails when a plan falls
+back to a sequential scan of a large table or spills a sort to disk. The transaction is rolled back at the end, so the
+database is left as it was; still, point it at a scratch database.
+
+Usage: DATABASE_URL=postgresql://... python tools/check_query_plans.py [task_count]
+'''
+import importlib
+import json
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Modules of each function that define registered statements
+STATEMENT_MODULES = {
+    'tasks': ['queries', 'history', 'recurrence', 'archive', 'attachments', 'downloads', 'idempotency', 'ratelimit'],
+    'employees': ['queries', 'workload', 'downloads', 'idempotency', 'ratelimit']
+}
+
+# Modules both functions have under the same name, dropped before each import
+SHARED_MODULES = ('index', 'statements', 'resilience', 'ratelimit', 'compression', 'idempotency', 'export',
+                  'responses', 'downloads', 'storage', 'queries', 'history', 'workload', 'recurrence',
+                  'attachments', 'archive', 'maintenance', 'passwords', 'sessions')
+
+# COPY cannot run a prepared statement, so exports build their SQL per
+# request: each sample is a builder of the function's index module and the
+# query parameters it is called with
+EXPORT_QUERIES = {
+    'tasks': [('task_export', 'build_task_export_query', {}),
+              ('task_export_week', 'build_task_export_query', {'dueFrom': '{week_start}', 'dueTo': '{week_end}'}),
+              ('task_export_archive', 'build_task_export_query', {'status': 'completed', 'includeArchived': 'true'})],
+    'employees': [('employee_export', 'build_employee_export_query', {}),
+                  ('employee_export_by_group', 'build_employee_export_query', {'group_id': '{group_id}'})]
+}
+
+# Tables that grow with usage; a sequential scan over one of them is a regression
+LARGE_TABLES = re.compile(r'^(tasks|tasks_archive\w*|task_history\w*|task_templates|employees|users|idempotency_keys|'
+                          r'rate_limit_buckets|attachment_\w+)$')
+
+# A sequential scan that reads at least this many rows of a large table is
+# a regression, whatever its filter keeps: every seeded large table is far
+# bigger. A month of the seeded archive is about half of it, so reading
+# the one partition left after pruning still passes. Scans feeding an
+# aggregate are expected: a report over a table has to read all of it.
+SEQ_SCAN_MIN_ROWS = 2000
+
+# Exports read whole tables or large slices of them; a sequential scan
+# beats an index once a query keeps this share of the rows it reads
+FULL_READ_MIN_SHARE = 0.1
+
+SEED_SQL = '''
+    INSERT INTO employee_groups (name, description)
+    SELECT 'Группа ' || g, 'Нагрузочные данные' FROM generate_series(1, 40) g;
+
+    INSERT INTO employee_groups (name, description) VALUES ('Пустая группа', 'Без сотрудников');
+
+    INSERT INTO employees (full_name, email, position, group_id)
+    SELECT 'Сотрудник ' || n, 'employee' || n || '@company.com', 'Специалист',
+           (SELECT id FROM employee_groups WHERE name = 'Группа ' || (1 + n %% 40))
+    FROM generate_series(1, 4000) n;
+
+    INSERT INTO employees (full_name, position) VALUES ('Стажёр без поручений', 'Стажёр');
+
+    INSERT INTO users (username, password_hash, full_name, role, employee_id)
+    SELECT 'user' || e.id, md5(e.id::text), e.full_name, 'employee', e.id
+    FROM employees e WHERE e.full_name LIKE 'Сотрудник %%' AND e.id %% 2 = 0;
+
+    INSERT INTO tasks (title, description, status, priority, assignee, due_date, created_at)
+    SELECT 'Поручение ' || n, 'Описание поручения ' || n,
+           (ARRAY['pending', 'pending', 'pending', 'pending', 'in-progress', 'in-progress',
+                  'in-progress', 'completed', 'completed', 'overdue'])[1 + n %% 10],
+           (ARRAY['low', 'medium', 'medium', 'high'])[1 + n %% 4],
+           'Сотрудник ' || (1 + n %% 4000),
+           NOW() + make_interval(hours => (n %% 17520) - 8760),
+           NOW() - make_interval(days => n %% 365)
+    FROM generate_series(1, %(task_count)s) n;
+
+    INSERT INTO task_history (task_id, changed_at, changed_by, changes)
+    SELECT t.id, NOW() - make_interval(mins => n), NULL, '{"status": {"from": "pending", "to": "in-progress"}}'
+    FROM tasks t, generate_series(1, 2) n
+    WHERE t.title LIKE 'Поручение %%';
+
+    INSERT INTO tasks_archive (id, title, description, status, priority, assignee, due_date, created_at, updated_at)
+    SELECT -n, 'Архивное поручение ' || n, '', 'completed', (ARRAY['low', 'medium', 'high'])[1 + n %% 3],
+           'Сотрудник ' || (1 + n %% 4000),
+           NOW() - make_interval(days => 200 + n %% 700), NOW() - make_interval(days => 900), NOW() - make_interval(days => 200)
+    FROM generate_series(1, %(task_count)s / 2) n;
+
+    INSERT INTO task_templates (title, assignee, frequency, interval_count, starts_on, created_at, generated_until)
+    SELECT 'Шаблон ' || n, 'Сотрудник ' || (1 + n %% 4000),
+           (ARRAY['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'])[1 + n %% 4], 1 + n %% 3,
+           CURRENT_DATE - 400 + n %% 365, CURRENT_DATE - 400,
+           CASE WHEN n %% 20 = 0 THEN NULL ELSE CURRENT_DATE + 30 END
+    FROM generate_series(1, %(task_count)s / 10) n;
+
+    INSERT INTO idempotency_keys (scope, idempotency_key, request_hash, status_code, response_body, created_at, expires_at)
+    SELECT 'tasks', 'key-' || n, md5(n::text) || md5(n::text), 201, '{}',
+           NOW() - make_interval(mins => n %% 2880), NOW() - make_interval(mins => n %% 2880) + INTERVAL '24 hours'
+    FROM generate_series(1, %(task_count)s) n;
+
+    INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at)
+    SELECT 'bucket-' || n || ':read', 30, NOW() - make_interval(secs => n %% 3600)
+    FROM generate_series(1, %(task_count)s / 5) n;
+
+    INSERT INTO attachment_objects (sha256, size, content_type, created_at, expires_at)
+    SELECT encode(sha256(n::text::bytea), 'hex'), 1000 + n, 'application/pdf', NOW() - make_interval(hours => n %% 720),
+           CASE WHEN n %% 10 = 0 THEN NOW() + make_interval(hours => 24 - n %% 48) END
+    FROM generate_series(1, %(task_count)s / 5) n;
+
+    INSERT INTO attachment_uploads (id, file_name, content_type, total_size, received_size, sha256, created_at, completed_at)
+    SELECT gen_random_uuid(), 'Файл ' || n || '.pdf', 'application/pdf', 1000 + n,
+           CASE WHEN n %% 20 = 0 THEN 0 ELSE 1000 + n END,
+           CASE WHEN n %% 20 = 0 THEN NULL ELSE encode(sha256(n::text::bytea), 'hex') END,
+           NOW() - make_interval(hours => n %% 720),
+           CASE WHEN n %% 20 = 0 THEN NULL ELSE NOW() - make_interval(hours => n %% 720) END
+    FROM generate_series(1, %(task_count)s / 5) n;
+
+    INSERT INTO report_cache (cache_key, data_version, payload)
+    VALUES ('workload', '1:1', '{"workload": []}')
+    ON CONFLICT (cache_key) DO NOTHING;
+
+    ANALYZE employee_groups;
+    ANALYZE employees;
+    ANALYZE users;
+    ANALYZE tasks;
+    ANALYZE task_history;
+    ANALYZE tasks_archive;
+    ANALYZE task_templates;
+    ANALYZE idempotency_keys;
+    ANALYZE rate_limit_buckets;
+    ANALYZE attachment_objects;
+    ANALYZE attachment_uploads;
+'''
+
+def load_statements() -> List[Tuple[str, Any]]:
+    '''Collect every Statement defined by the registry modules of both functions'''
+    found = []
+    for function_name, module_names in STATEMENT_MODULES.items():
+        function_dir = os.path.abspath(os.path.join(BACKEND_DIR, function_name))
+        sys.path.insert(0, function_dir)
+        for shared in SHARED_MODULES:
+            sys.modules.pop(shared, None)
+
+        statement_class = importlib.import_module('statements').Statement
+        for module_name in module_names:
+            module = importlib.import_module(module_name)
+            for value in vars(module).values():
+                candidates = value.values() if isinstance(value, dict) else [value]
+                for candidate in candidates:
+                    if isinstance(candidate, statement_class):
+                        found.append((function_name, candidate))
+        sys.path.remove(function_dir)
+
+    unique = {}
+    for function_name, statement in found:
+        unique[statement.name] = (function_name, statement)
+    return sorted(unique.values(), key=lambda item: item[1].name)
+
+def load_export_builders() -> List[Tuple[str, str, Callable, Dict[str, str], str]]:
+    '''Pair every EXPORT_QUERIES sample with its function's builder and the work_mem exports run with'''
+    builders = []
+    for function_name, samples in EXPORT_QUERIES.items():
+        function_dir = os.path.abspath(os.path.join(BACKEND_DIR, function_name))
+        sys.path.insert(0, function_dir)
+        for shared in SHARED_MODULES:
+            sys.modules.pop(shared, None)
+
+        index = importlib.import_module('index')
+        work_mem = importlib.import_module('export').EXPORT_WORK_MEM
+        for name, builder_name, query_params in samples:
+            builders.append((function_name, name, getattr(index, builder_name), query_params, work_mem))
+        sys.path.remove(function_dir)
+    return builders
+
+def seeded_ids(cur) -> Dict[str, Any]:
+    cur.execute('''
+        SELECT
+            (SELECT id FROM tasks WHERE title = 'Поручение 7') AS task_id,
+            (SELECT id FROM employee_groups WHERE name = 'Группа 7') AS group_id,
+            (SELECT id FROM employee_groups WHERE name = 'Пустая группа') AS empty_group_id,
+            (SELECT id FROM employees WHERE full_name = 'Сотрудник 7') AS employee_id,
+            (SELECT id FROM employees WHERE full_name = 'Стажёр без поручений') AS intern_id,
+            (SELECT MAX(changed_at) FROM task_history) AS changed_at,
+            (SELECT MAX(id) FROM task_history) AS history_id,
+            (SELECT id::text FROM attachment_uploads WHERE file_name = 'Файл 20.pdf') AS upload_id,
+            (SELECT sha256 FROM attachment_objects WHERE size = 1007) AS sha256
+    ''')
+    return dict(zip(('task_id', 'group_id', 'empty_group_id', 'employee_id', 'intern_id', 'changed_at', 'history_id', 'upload_id',
+                     'sha256'), cur.fetchone()))
+
+def sample_params(name: str, ids: Dict[str, Any]) -> Tuple:
+    '''Representative parameters per statement; a new statement without an entry fails the check'''
+    if name.startswith('task_list'):
+        # The archive is only read together with completed tasks
+        params = []
+        if '_status' in name:
+            params.append('completed' if name.endswith('_archive') else 'overdue')
+        if '_priority' in name:
+            params.append('high')
+        if '_due' in name:
+            # A week view; archived tasks are all older than the retention window
+            week_start = date.today() - timedelta(days=300 if name.endswith('_archive') else 0)
+            params.extend([week_start, week_start + timedelta(days=7)])
+        # A first page of 200; unpaged requests read the whole list, as the
+        # API did before paging, and are not what this check guards
+        params.extend([datetime.min, 0, 200])
+        return tuple(params)
+
+    month_start = date.today().replace(day=1)
+    archived_month_start = (month_start - timedelta(days=300)).replace(day=1)
+    untouched_fields = [False, None] * 6
+    samples = {
+        'task_insert': ('Поручение', '', 'pending', 'high', 'Сотрудник 7', '2030-01-01', '[]'),
+        'task_update': tuple([ids['task_id'], True, 'Новое название'] + untouched_fields + [None]),
+        'task_in_group': (ids['task_id'], ids['group_id']),
+        'task_delete': (ids['task_id'],),
+        'task_calendar': (month_start, (month_start + timedelta(days=32)).replace(day=1)),
+        'task_calendar_archive': (archived_month_start, (archived_month_start + timedelta(days=32)).replace(day=1)),
+        'task_history_page': (ids['task_id'], 50),
+        'task_history_page_before': (ids['task_id'], ids['changed_at'], ids['history_id'], 50),
+        'employee_list': ('', 0, 200),
+        'employee_list_by_group': (ids['group_id'], '', 0, 200),
+        'employee_insert': ('Новый сотрудник', None, None, ids['group_id']),
+        'employee_update': tuple([True, 'Сотрудник 7', False, None, False, None, False, None, ids['employee_id']]),
+        'employee_delete': (ids['intern_id'],),
+        'group_name': (ids['group_id'],),
+        'user_login': ('user14',),
+        'user_rehash': (ids['employee_id'], 'scrypt$16384$8$1$salt$hash', 'legacy'),
+        'user_touch_login': (ids['employee_id'],),
+        'template_generate': (500, 92),
+        'template_insert': ('Отчёт', '', 'high', 'Сотрудник 7', 'MONTHLY', 1, '2030-01-31', None, '23:59:59', 7),
+        'partitions_ensure': ('task_history', month_start, 4),
+        'archive_bounds': (180, 3),
+        'archive_batch': (180, 1000),
+        'group_insert': ('Новая группа', ''),
+        'group_update': ('Группа 7', 'Переименована', ids['group_id']),
+        'group_employee_count': (ids['group_id'],),
+        'group_release_employees': (ids['group_id'],),
+        'group_delete': (ids['empty_group_id'],),
+        'data_version': (),
+        'report_cache_lookup': ('workload', '1:1', 60),
+        'report_cache_store': ('workload', '2:1', '{"workload": []}'),
+        'idempotency_lock': ('tasks:key-7',),
+        'idempotency_lookup': ('tasks', 'key-7'),
+        'idempotency_store': ('tasks', 'key-new', '0' * 64, 201, '{}'),
+        'idempotency_purge': (500,),
+        'rate_limit_bucket_take': ('bucket-7:read', 30, 1, 10),
+        'rate_limit_bucket_purge': (500,),
+        'upload_insert': ('00000000-0000-4000-8000-000000000001', 'Отчёт.pdf', 'application/pdf', 1000),
+        'upload_status': (ids['upload_id'],),
+        'upload_restart': (ids['upload_id'],),
+        'upload_advance': (1020, ids['upload_id'], 0),
+        'upload_lock': (ids['upload_id'],),
+        'upload_complete': (ids['sha256'], ids['upload_id']),
+        'attachment_object_insert': (ids['sha256'], 1007, 'application/pdf'),
+        'abandoned_uploads': (24, 200),
+        'uploads_delete': ([ids['upload_id']],),
+        'stored_object': (ids['sha256'],),
+        'export_object_insert': (ids['sha256'], 1007, 'text/csv', 24),
+        'expired_exports_delete': (200,)
+    }
+    return samples[name]
+
+def plan_problems(node: Dict[str, Any], aggregated: bool = False, full_read: bool = False) -> List[str]:
+    '''
+    Regressions in a plan tree. With full_read, as for exports, a scan that
+    keeps at least FULL_READ_MIN_SHARE of the rows it reads is expected.
+    '''
+    problems = []
+    aggregated = aggregated or node['Node Type'] == 'Aggregate'
+    relation = node.get('Relation Name', '')
+    loops = node.get('Actual Loops', 1)
+    rows_kept = node.get('Actual Rows', 0) * loops
+    rows_read = rows_kept + node.get('Rows Removed by Filter', 0) * loops
+    if (node['Node Type'] == 'Seq Scan' and LARGE_TABLES.match(relation)
+            and rows_read >= SEQ_SCAN_MIN_ROWS and not aggregated
+            and not (full_read and rows_kept >= rows_read * FULL_READ_MIN_SHARE)):
+        problems.append(f'sequential scan on {relation} keeps {rows_kept} of {rows_read} rows')
+    if node['Node Type'] in ('Sort', 'Incremental Sort') and node.get('Sort Space Type') == 'Disk':
+        problems.append(f"on-disk sort ({node.get('Sort Space Used')} kB) by {', '.join(node.get('Sort Key', []))}")
+    for child in node.get('Plans', []):
+        problems.extend(plan_problems(child, aggregated, full_read))
+    return problems
+
+def report(label: str, plan: Dict[str, Any], full_read: bool = False) -> int:
+    '''Print one plan's verdict and return 1 if it is a regression'''
+    problems = plan_problems(plan['Plan'], full_read=full_read)
+    status = 'FAIL' if problems else 'ok'
+    print(f"{status:>4}  {label} {plan.get('Execution Time', 0):.1f} ms" + (': ' + '; '.join(problems) if problems else ''))
+    if problems and os.environ.get('PLAN_CHECK_VERBOSE'):
+        print(json.dumps(plan, indent=2, default=str))
+    return 1 if problems else 0
+
+def main() -> int:
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print('Set DATABASE_URL to a scratch database with all migrations applied')
+        return 2
+    task_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    statements = load_statements()
+    export_builders = load_export_builders()
+    conn = psycopg2.connect(database_url)
+    cur = conn.cursor()
+
+    print(f'Seeding {task_count} tasks...')
+    cur.execute(SEED_SQL, {'task_count': task_count})
+    ids = seeded_ids(cur)
+
+    failures = 0
+    for function_name, statement in statements:
+        params = sample_params(statement.name, ids) if statement.param_count else ()
+        cur.execute(f'PREPARE {statement.name} AS {statement.sql}')
+
+        for plan_mode in ('force_custom_plan', 'force_generic_plan'):
+            cur.execute('SAVEPOINT plan_check')
+            cur.execute('SET LOCAL plan_cache_mode = ' + plan_mode)
+            cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + statement.execute_sql, params)
+            plan = cur.fetchone()[0][0]
+            cur.execute('ROLLBACK TO SAVEPOINT plan_check')
+            failures += report(f"{function_name}/{statement.name} [{plan_mode.split('_')[1]}]", plan)
+
+    week_start = date.today()
+    placeholders = {'week_start': week_start.isoformat(), 'week_end': (week_start + timedelta(days=6)).isoformat(),
+                    'group_id': str(ids['group_id'])}
+    for function_name, name, builder, query_params, work_mem in export_builders:
+        query, params = builder({key: value.format(**placeholders) for key, value in query_params.items()})
+        cur.execute('SAVEPOINT plan_check')
+        cur.execute('SET LOCAL work_mem = %s', (work_mem,))
+        cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + query, params)
+        plan = cur.fetchone()[0][0]
+        cur.execute('ROLLBACK TO SAVEPOINT plan_check')
+        failures += report(f'{function_name}/{name} [export]', plan, full_read=True)
+
+    conn.rollback()
+    conn.close()
+
+    print(f'{len(statements)} statements and {len(export_builders)} export queries checked, {failures} plan regressions')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+'''
+Fault injection check for the backend functions.
+
+Drives the handler of each function against a stand-in database that
+accepts TCP connections and never answers, like a Postgres stuck under
+load, and fails unless every request gives up within the connect timeout
+and the circuit breaker opens, fails fast and re-opens after a failed
+probe. With DATABASE_URL set it also checks that a successful probe
+closes the breaker, that the route's statement_timeout cancels a stalled
+query, and that requests ending in an early return or an error hand their
+connection back to the pool exactly once.
+
+Usage: [DATABASE_URL=postgresql://...] python tools/check_resilience.py
+'''
+import importlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+FUNCTIONS = ('tasks', 'employees')
+SHARED_MODULES = ('index', 'statements', 'resilience', 'ratelimit', 'compression', 'idempotency', 'export',
+                  'responses', 'downloads', 'storage', 'queries', 'history', 'workload', 'recurrence',
+                  'attachments', 'archive', 'maintenance', 'passwords', 'sessions')
+
+# libpq rounds connect_timeout below 2 seconds up to 2
+CONNECT_TIMEOUT_SECONDS = 2
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT_SECONDS = 2
+
+# A plain read, an update rejected with 400 before touching the rows and
+# one failing with 500 on a malformed body; the last two used to skip the
+# connection release
+SAMPLE_REQUESTS = {
+    'tasks': [{'httpMethod': 'GET', 'queryStringParameters': {'resource': 'history', 'taskId': '1'}},
+              {'httpMethod': 'PUT', 'queryStringParameters': {}},
+              {'httpMethod': 'PUT', 'queryStringParameters': {}, 'pathParams': {'id': '1'}, 'body': '{'}],
+    'employees': [{'httpMethod': 'GET', 'queryStringParameters': {'resource': 'groups'}},
+                  {'httpMethod': 'PUT', 'queryStringParameters': {'resource': 'groups'}},
+                  {'httpMethod': 'PUT', 'queryStringParameters': {'resource': 'groups'}, 'pathParams': {'id': '1'},
+                   'body': '{'}]
+}
+
+class Context:
+    request_id = 'check-resilience'
+    function_name = 'check-resilience'
+
+def start_stalled_server() -> str:
+    '''Listen on a free port, accept every connection and never answer'''
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(64)
+    held_connections = []
+
+    def accept_and_stall() -> None:
+        while True:
+            client, _ = server.accept()
+            held_connections.append(client)
+
+    threading.Thread(target=accept_and_stall, daemon=True).start()
+    return f'postgresql://app@127.0.0.1:{server.getsockname()[1]}/app'
+
+def load_function(function_name: str):
+    '''Import a fresh copy of the function's index module'''
+    function_dir = os.path.abspath(os.path.join(BACKEND_DIR, function_name))
+    for shared in SHARED_MODULES:
+        sys.modules.pop(shared, None)
+    sys.path.insert(0, function_dir)
+    try:
+        return importlib.import_module('index')
+    finally:
+        sys.path.remove(function_dir)
+
+def timed(call: Callable[[], Any]):
+    started = time.monotonic()
+    result = call()
+    return result, time.monotonic() - started
+
+def check_stalled_database(index, function_name: str, stalled_url: str) -> List[str]:
+    problems = []
+    index.db_breaker = index.CircuitBreaker(failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT_SECONDS)
+    event = SAMPLE_REQUESTS[function_name][0]
+    os.environ['DATABASE_URL'] = stalled_url
+
+    for attempt in range(FAILURE_THRESHOLD * 2):
+        response, elapsed = timed(lambda: index.handler(event, Context()))
+        opened = attempt >= FAILURE_THRESHOLD
+        limit = 0.5 if opened else CONNECT_TIMEOUT_SECONDS + 1
+        print(f"{function_name}: stalled attempt {attempt + 1} -> {response['statusCode']} after {elapsed:.2f}s, "
+              f'breaker {index.db_breaker.state}')
+        if response['statusCode'] != 503:
+            problems.append(f"stalled attempt {attempt + 1} answered {response['statusCode']}, expected 503")
+        if elapsed > limit:
+            problems.append(f'stalled attempt {attempt + 1} took {elapsed:.2f}s, limit {limit}s')
+    if index.db_breaker.state != 'open':
+        problems.append(f'breaker is {index.db_breaker.state} after {FAILURE_THRESHOLD} failures')
+
+    time.sleep(RESET_TIMEOUT_SECONDS)
+    response, _ = timed(lambda: index.handler(event, Context()))
+    if response['statusCode'] != 503 or index.db_breaker.state != 'open':
+        problems.append('failed half-open probe did not re-open the breaker')
+    return problems
+
+def check_live_database(index, function_name: str, database_url: str) -> List[str]:
+    problems = []
+    os.environ['DATABASE_URL'] = database_url
+
+    time.sleep(RESET_TIMEOUT_SECONDS)
+    response = index.handler(SAMPLE_REQUESTS[function_name][0], Context())
+    if response['statusCode'] != 200 or index.db_breaker.state != 'closed':
+        problems.append(f"probe against the live database answered {response['statusCode']}, "
+                        f'breaker {index.db_breaker.state}')
+
+    conn = index.get_db_connection('read')
+    cur = conn.cursor()
+    try:
+        _, elapsed = timed(lambda: cur.execute('SELECT pg_sleep(%s)', (index.STATEMENT_TIMEOUTS_MS['read'] / 1000 + 5,)))
+        problems.append(f'statement_timeout did not cancel the stalled query ({elapsed:.2f}s)')
+    except psycopg2.extensions.QueryCanceledError:
+        print(f'{function_name}: stalled query cancelled by statement_timeout')
+    cur.close()
+    conn.close()
+    conn.close()
+
+    # Every request reuses the one parked connection and parks it again once
+    index.db_pool.idle = []
+    connects = index.db_pool.connects
+    for event in SAMPLE_REQUESTS[function_name] * 3:
+        response = index.handler(event, Context())
+        if response['statusCode'] == 500 and 'Expecting' in response['body']:
+            problems.append('500 response leaks the exception message')
+    pool: Dict[str, Any] = index.db_pool.snapshot()
+    print(f'{function_name}: pool after sample requests {json.dumps(pool)}')
+    if pool['idle'] != 1 or pool['connects'] != connects + 1:
+        problems.append(f'connections were not released exactly once: {json.dumps(pool)}')
+    return problems
+
+def main() -> int:
+    os.environ['DB_CONNECT_TIMEOUT'] = str(CONNECT_TIMEOUT_SECONDS)
+    database_url = os.environ.get('DATABASE_URL')
+    stalled_url = start_stalled_server()
+
+    failures = 0
+    for function_name in FUNCTIONS:
+        index = load_function(function_name)
+        problems = check_stalled_database(index, function_name, stalled_url)
+        if database_url:
+            problems += check_live_database(index, function_name, database_url)
+        for problem in problems:
+            print(f'FAIL  {function_name}: {problem}')
+        failures += len(problems)
+
+    if not database_url:
+        print('DATABASE_URL is not set: skipped the live database checks')
+    print(f'{len(FUNCTIONS)} functions checked, {failures} resilience failures')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
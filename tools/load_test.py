@@ -0,0 +1,409 @@
+'''
+Load test for the backend functions.
+
+Replays the scenarios of backend/<function>/tests.json against local
+instances of the handlers. Besides name, method, path and expectedStatus
+a scenario may set:
+
+    weight       relative share of requests (default 1, 0 excludes it)
+    expectedStatuses
+                 statuses that all count as success, instead of the single
+                 expectedStatus; exports answer 200 when small and 303 to
+                 the stored file when large
+    body         request body, a JSON object or a string
+    headers      extra request headers
+    thinkTimeMs  mean pause of a user after this request (default 0)
+
+The workload is open: user sessions arrive as a Poisson process at the
+target rate regardless of how fast earlier requests complete, and each
+session makes on average --session-length requests, pausing for the
+think time between them. Every function gets its own worker processes,
+each importing the handler like a warm instance, with a thread per
+concurrent request. Latency is measured from the moment a request was
+due, so a saturated instance shows up as queueing delay rather than as
+fewer requests sent.
+
+Each instance keeps its admission control (backend/<function>/ratelimit.py):
+beyond MAX_IN_FLIGHT requests, or a route's max_concurrency, it sheds load
+with 503. Threads per worker default to MAX_IN_FLIGHT so the runner does
+not overload an instance more than a gateway would; rejections that remain
+are the instance shedding load and count as errors. --no-admission-limits
+replaces the limiter with one that admits everything, to measure the
+database path alone.
+
+The runner starts at --start-rate sessions per second, doubles the rate
+while the --percentile latency stays within --slo-ms and the error rate
+within --max-error-rate, then bisects between the last passing and the
+first failing rate. Point it at a scratch database: scenarios may write.
+
+Usage: DATABASE_URL=postgresql://... python tools/load_test.py [--slo-ms 250] [--rate 50]
+'''
+import argparse
+import heapq
+import importlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Requests an instance admits at once, as in backend/<function>/ratelimit.py
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', '16'))
+
+# Latencies keep this many significant bits (under 1% error), as HdrHistogram does
+SUB_BUCKET_BITS = 8
+
+class Histogram:
+    '''
+    Log-linear latency histogram in microseconds. Counts are keyed by the
+    lowest value of their bucket, so histograms recorded in different
+    processes merge by adding counts.
+    '''
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+
+    @staticmethod
+    def bucket(value: int) -> Tuple[int, int]:
+        shift = max(0, value.bit_length() - SUB_BUCKET_BITS)
+        return (value >> shift) << shift, shift
+
+    def record(self, value: int) -> None:
+        key, _ = self.bucket(max(0, value))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def merge(self, other: 'Histogram') -> None:
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def percentile(self, percent: float) -> float:
+        '''Highest value equivalent to the requested percentile, in milliseconds'''
+        total = self.total
+        if not total:
+            return 0.0
+        rank = max(1, math.ceil(total * percent / 100))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                _, shift = self.bucket(key)
+                return (key + (1 << shift) - 1) / 1000
+        return 0.0
+
+def load_scenarios(function_names: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    '''Weighted scenarios of each function's tests.json'''
+    scenarios = {}
+    for function_name in function_names:
+        with open(os.path.join(BACKEND_DIR, function_name, 'tests.json'), encoding='utf-8') as tests_file:
+            tests = json.load(tests_file)['tests']
+        weighted = [test for test in tests if test.get('weight', 1) > 0]
+        if weighted:
+            scenarios[function_name] = weighted
+    return scenarios
+
+def expected_statuses(scenario: Dict[str, Any]) -> List[int]:
+    return scenario.get('expectedStatuses') or [scenario.get('expectedStatus', 200)]
+
+def build_event(scenario: Dict[str, Any], client_ip: str) -> Dict[str, Any]:
+    '''Gateway event for a scenario, e.g. path "/42?resource=history&taskId=1"'''
+    path, _, query = scenario['path'].partition('?')
+    body = scenario.get('body')
+    event = {
+        'httpMethod': scenario['method'],
+        'headers': dict(scenario.get('headers') or {}),
+        'queryStringParameters': dict(parse_qsl(query)),
+        'requestContext': {'identity': {'sourceIp': client_ip}},
+        'isBase64Encoded': False
+    }
+    if path.strip('/'):
+        event['pathParams'] = {'id': path.strip('/')}
+    if body is not None:
+        event['body'] = body if isinstance(body, str) else json.dumps(body)
+    return event
+
+class StepRecorder:
+    '''Per-scenario latencies and status codes of one worker during one step'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scenarios: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, scenario: Dict[str, Any], status: int, latency_us: int) -> None:
+        with self.lock:
+            stats = self.scenarios.setdefault(scenario['name'], {'histogram': Histogram(), 'errors': 0, 'statuses': {}})
+            stats['histogram'].record(latency_us)
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            if status not in expected_statuses(scenario):
+                stats['errors'] += 1
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            name: {'counts': stats['histogram'].counts, 'errors': stats['errors'], 'statuses': stats['statuses']}
+            for name, stats in self.scenarios.items()
+        }
+
+def run_step(handler, scenarios: List[Dict[str, Any]], rate: float, duration: float, warmup: float,
+             session_length: float, concurrency: int, client_count: int, seed: int) -> Dict[str, Any]:
+    '''
+    Drive one handler at a fixed session arrival rate for duration seconds.
+    A dispatcher thread releases requests from a timeline of due times to a
+    thread pool; sessions put their next request back on the timeline after
+    the think time instead of holding a thread while they wait.
+    '''
+    rng = random.Random(seed)
+    weights = [scenario.get('weight', 1) for scenario in scenarios]
+    continue_probability = 1 - 1 / session_length if session_length > 1 else 0.0
+    recorder = StepRecorder()
+    timeline: List[Tuple[float, int, Optional[Dict[str, Any]]]] = []
+    sequence = itertools.count()
+    condition = threading.Condition()
+    in_flight = 0
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = started + duration
+
+    def send(due: float, session: Dict[str, Any]) -> None:
+        nonlocal in_flight
+        session_rng = session['rng']
+        scenario = session_rng.choices(scenarios, weights)[0]
+        try:
+            status = handler(build_event(scenario, session['client_ip']), None)['statusCode']
+        except Exception:
+            status = 0
+        finished = time.perf_counter()
+        if due >= measure_from:
+            recorder.record(scenario, status, int((finished - due) * 1e6))
+
+        with condition:
+            in_flight -= 1
+            if session_rng.random() < continue_probability:
+                think_ms = scenario.get('thinkTimeMs', 0)
+                next_due = finished + (session_rng.expovariate(1000 / think_ms) if think_ms else 0.0)
+                if next_due < stop_at:
+                    heapq.heappush(timeline, (next_due, next(sequence), session))
+            condition.notify()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Entries without a session are arrivals of new sessions
+        heapq.heappush(timeline, (started + rng.expovariate(rate), next(sequence), None))
+        while True:
+            with condition:
+                if not timeline:
+                    if not in_flight:
+                        break
+                    condition.wait()
+                    continue
+                due = timeline[0][0]
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    condition.wait(delay)
+                    continue
+                _, _, session = heapq.heappop(timeline)
+                if session is None:
+                    client = rng.randrange(client_count)
+                    session = {
+                        'rng': random.Random(rng.getrandbits(64)),
+                        'client_ip': f'10.{client >> 16 & 255}.{client >> 8 & 255}.{client & 255}'
+                    }
+                    next_arrival = due + rng.expovariate(rate)
+                    if next_arrival < stop_at:
+                        heapq.heappush(timeline, (next_arrival, next(sequence), None))
+                in_flight += 1
+            executor.submit(send, due, session)
+
+    return recorder.result()
+
+class UnlimitedAdmission:
+    '''Stand-in for the instance's RateLimiter that admits every request'''
+
+    def admit(self, event: Dict[str, Any], route: str) -> None:
+        return None
+
+    def release(self, route: str) -> None:
+        pass
+
+    def check_shared(self, conn, event: Dict[str, Any], route: str) -> None:
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {}
+
+def worker_main(function_name: str, scenarios: List[Dict[str, Any]], pipe, concurrency: int, client_count: int,
+                admission_limits: bool) -> None:
+    '''One warm function instance: import the handler once, then run steps on request'''
+    sys.path.insert(0, os.path.abspath(os.path.join(BACKEND_DIR, function_name)))
+    index = importlib.import_module('index')
+    if not admission_limits:
+        index.rate_limiter = UnlimitedAdmission()
+    handler = index.handler
+    pipe.send('ready')
+    while True:
+        command = pipe.recv()
+        if command is None:
+            break
+        pipe.send(run_step(handler, scenarios, concurrency=concurrency, client_count=client_count, **command))
+
+class WorkerPool:
+    '''Worker processes per function, each with its share of the arrival rate'''
+
+    def __init__(self, scenarios: Dict[str, List[Dict[str, Any]]], processes: int, concurrency: int, client_count: int,
+                 admission_limits: bool = True):
+        total_weight = sum(scenario.get('weight', 1) for tests in scenarios.values() for scenario in tests)
+        self.workers = []
+        for function_name, tests in scenarios.items():
+            share = sum(scenario.get('weight', 1) for scenario in tests) / total_weight
+            for _ in range(processes):
+                parent_pipe, child_pipe = multiprocessing.Pipe()
+                process = multiprocessing.Process(
+                    target=worker_main,
+                    args=(function_name, tests, child_pipe, concurrency, client_count, admission_limits),
+                    daemon=True
+                )
+                process.start()
+                self.workers.append((function_name, share / processes, parent_pipe, process))
+        for _, _, pipe, _ in self.workers:
+            pipe.recv()
+
+    def run(self, rate: float, duration: float, warmup: float, session_length: float) -> Dict[str, Any]:
+        seed = random.getrandbits(32)
+        for index, (_, share, pipe, _) in enumerate(self.workers):
+            pipe.send({'rate': rate * share, 'duration': duration, 'warmup': warmup,
+                       'session_length': session_length, 'seed': seed + index})
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for function_name, _, pipe, _ in self.workers:
+            for name, stats in pipe.recv().items():
+                target = merged.setdefault(f'{function_name}/{name}', {'histogram': Histogram(), 'errors': 0, 'statuses': {}})
+                target['histogram'].merge(Histogram(stats['counts']))
+                target['errors'] += stats['errors']
+                for status, count in stats['statuses'].items():
+                    target['statuses'][status] = target['statuses'].get(status, 0) + count
+        return {'scenarios': merged, 'elapsed': duration - warmup}
+
+    def close(self) -> None:
+        for _, _, pipe, process in self.workers:
+            pipe.send(None)
+            process.join()
+
+def summarize(result: Dict[str, Any], percent: float) -> Dict[str, Any]:
+    overall = Histogram()
+    errors = 0
+    for stats in result['scenarios'].values():
+        overall.merge(stats['histogram'])
+        errors += stats['errors']
+    requests = overall.total
+    return {
+        'requests': requests,
+        'throughput': requests / result['elapsed'] if result['elapsed'] > 0 else 0.0,
+        'errorRate': errors / requests if requests else 0.0,
+        'p50': overall.percentile(50),
+        'tail': overall.percentile(percent)
+    }
+
+def print_scenarios(result: Dict[str, Any], percent: float) -> None:
+    print(f"{'scenario':<50} {'requests':>8} {'errors':>7} {'p50 ms':>8} {f'p{percent:g} ms':>9} {'max ms':>9}  statuses")
+    for name, stats in sorted(result['scenarios'].items()):
+        histogram = stats['histogram']
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(stats['statuses'].items()))
+        print(f"{name:<50} {histogram.total:>8} {stats['errors']:>7} {histogram.percentile(50):>8.1f} "
+              f"{histogram.percentile(percent):>9.1f} {histogram.percentile(100):>9.1f}  {statuses}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Open-loop load test of the backend handlers')
+    parser.add_argument('--functions', nargs='+', default=['tasks', 'employees'])
+    parser.add_argument('--processes', type=int, default=2, help='worker processes per function')
+    parser.add_argument('--concurrency', type=int, default=MAX_IN_FLIGHT,
+                        help='concurrent requests per worker process; above MAX_IN_FLIGHT the instance answers 503')
+    parser.add_argument('--no-admission-limits', dest='admission_limits', action='store_false',
+                        help="admit every request instead of the instance's rate limiter")
+    parser.add_argument('--clients', type=int, default=1000, help='distinct simulated client addresses')
+    parser.add_argument('--session-length', type=float, default=1.0, help='mean requests per user session')
+    parser.add_argument('--slo-ms', type=float, default=250.0)
+    parser.add_argument('--percentile', type=float, default=99.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--rate', type=float, help='run a single step at this session rate instead of searching')
+    parser.add_argument('--start-rate', type=float, default=10.0)
+    parser.add_argument('--max-rate', type=float, default=5000.0)
+    parser.add_argument('--bisect-steps', type=int, default=4)
+    parser.add_argument('--step-seconds', type=float, default=15.0)
+    parser.add_argument('--warmup-seconds', type=float, default=3.0)
+    parser.add_argument('--json', help='write every step summary to this file')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print('Set DATABASE_URL to a scratch database with all migrations applied')
+        return 2
+
+    scenarios = load_scenarios(args.functions)
+    pool = WorkerPool(scenarios, args.processes, args.concurrency, args.clients, args.admission_limits)
+    steps = []
+
+    def step(rate: float) -> Tuple[bool, Dict[str, Any]]:
+        result = pool.run(rate, args.step_seconds, args.warmup_seconds, args.session_length)
+        summary = summarize(result, args.percentile)
+        passed = summary['requests'] > 0 and summary['tail'] <= args.slo_ms and summary['errorRate'] <= args.max_error_rate
+        print(f"{'pass' if passed else 'FAIL'}  {rate:8.1f} sessions/s  {summary['throughput']:8.1f} req/s  "
+              f"p50 {summary['p50']:7.1f} ms  p{args.percentile:g} {summary['tail']:7.1f} ms  "
+              f"errors {summary['errorRate'] * 100:5.2f}%")
+        steps.append(dict(summary, rate=rate, passed=passed))
+        return passed, result
+
+    try:
+        if args.rate:
+            _, result = step(args.rate)
+            print_scenarios(result, args.percentile)
+            return 0
+
+        best: Optional[Tuple[float, Dict[str, Any]]] = None
+        rate = args.start_rate
+        failed_rate = None
+        while rate <= args.max_rate:
+            passed, result = step(rate)
+            if not passed:
+                failed_rate = rate
+                break
+            best = (rate, result)
+            rate *= 2
+
+        if failed_rate is not None:
+            low = best[0] if best else 0.0
+            high = failed_rate
+            for _ in range(args.bisect_steps):
+                rate = (low + high) / 2
+                passed, result = step(rate)
+                if passed:
+                    low = rate
+                    best = (rate, result)
+                else:
+                    high = rate
+
+        if not best:
+            print(f'No rate from {args.start_rate:g} sessions/s meets p{args.percentile:g} <= {args.slo_ms:g} ms')
+            return 1
+
+        print(f'\nMaximum sustainable rate: {best[0]:.1f} sessions/s '
+              f'(p{args.percentile:g} <= {args.slo_ms:g} ms, errors <= {args.max_error_rate * 100:g}%)')
+        print_scenarios(best[1], args.percentile)
+        return 0
+    finally:
+        pool.close()
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as json_file:
+                json.dump(steps, json_file, indent=2)
+
+if __name__ == '__main__':
+    sys.exit(main())